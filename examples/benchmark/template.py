@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+    Microbenchmark of the template rendering: a loop heavy page, timed
+    per node rendered.
+
+            $ python examples/benchmark/template.py
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from flango.template import Template
+
+
+SOURCE = '''<table>
+{% for row in rows %}
+<tr>
+{% for cell in row %}
+<td class="{{ cls }}">{{ cell }}</td>
+{% endfor %}
+</tr>
+{% endfor %}
+</table>'''
+
+
+def main(number=20):
+    rows = [list(range(10)) for _ in range(100)]
+    # per cell: 2 variables and 3 texts.
+    nodes = len(rows) * 10 * 5
+    for autoescape in (False, True):
+        template = Template(SOURCE, autoescape=autoescape)
+        seconds = min(timeit.repeat(lambda: template.render(rows=rows, cls='cell'), number=number, repeat=5))
+        print('autoescape={0}: {1:.3f} ms per render, {2:.1f} ns per node'.format(
+            autoescape, seconds / number * 1e3, seconds / number / nodes * 1e9))
+
+
+if __name__ == '__main__':
+    main()
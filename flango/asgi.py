@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI entry point of Flango applications, see `Flango.asgi`.
+
+`async def` view functions run on the event loop of the ASGI server,
+the other view functions, the static files and the streamed bodies run on
+the default executor of the loop so they never block it. Request, response and session are
+kept in the request context exactly like the WSGI entry point does.
+
+The module chains futures with callbacks instead of using `async def`,
+so the package still compiles on Python 2, where it is never imported.
+"""
+import sys
+import asyncio
+import inspect
+import functools
+from io import BytesIO
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+from .flango import FlangoException, STATIC_BLOCK_SIZE, _RequestContext, _isawaitable
+
+if bytes is str:
+    def _native(data):
+        return data
+else:
+    def _native(data):
+        return data.decode('latin-1')
+
+
+def handle(app, scope, receive, send):
+    if scope['type'] == 'http':
+        return _HTTPRequest(app, scope, receive, send).start()
+    if scope['type'] == 'lifespan':
+        return _Lifespan(scope, receive, send).start()
+    raise ValueError('Unsupported ASGI scope type: {0}.'.format(scope['type']))
+
+
+class _Handler(object):
+    """ Base class running callbacks in a copy of the context of the
+    caller, the returned future is done once the exchange is finished.
+    """
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.loop = asyncio.get_event_loop()
+        self.future = self.loop.create_future()
+        self.context = contextvars.copy_context() if contextvars else None
+
+    def start(self):
+        self._run(self.begin)
+        return self.future
+
+    def begin(self):
+        raise NotImplementedError
+
+    def _run(self, callback, *args):
+        try:
+            if self.context is not None:
+                self.context.run(callback, *args)
+            else:
+                callback(*args)
+        except Exception as e:
+            if not self.future.done():
+                self.future.set_exception(e)
+
+    def then(self, awaitable, callback):
+        """ Call `callback(future)` once `awaitable` is done. """
+        future = asyncio.ensure_future(awaitable)
+
+        def done(f):
+            if not self.future.done():
+                self._run(callback, f)
+
+        future.add_done_callback(done)
+
+    def finish(self, result=None):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class _Lifespan(_Handler):
+
+    def begin(self):
+        self.then(self.receive(), self.received)
+
+    def received(self, f):
+        message = f.result()
+        if message['type'] == 'lifespan.startup':
+            self.then(self.send({'type': 'lifespan.startup.complete'}),
+                      lambda f: self.begin())
+        elif message['type'] == 'lifespan.shutdown':
+            self.then(self.send({'type': 'lifespan.shutdown.complete'}),
+                      lambda f: self.finish())
+
+
+class _HTTPRequest(_Handler):
+
+    def __init__(self, app, scope, receive, send):
+        super(_HTTPRequest, self).__init__(scope, receive, send)
+        self.app = app
+        self.body = []
+        self.ctx = None
+        self.file = None
+        self.stream = None
+        self.chunks = None
+
+    def begin(self):
+        self.then(self.receive(), self.received)
+
+    def received(self, f):
+        message = f.result()
+        if message['type'] == 'http.disconnect':
+            return self.finish()
+        self.body.append(message.get('body', b''))
+        if message.get('more_body'):
+            self.begin()
+        else:
+            self.dispatch()
+
+    def environ(self):
+        scope = self.scope
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': _native(scope.get('query_string', b'')),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(b''.join(self.body)),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = _native(name).upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name in environ:
+                environ[name] += ',' + _native(value)
+            else:
+                environ[name] = _native(value)
+        return environ
+
+    def dispatch(self):
+        self.ctx = _RequestContext(self.app, self.environ())
+        self.ctx.push()
+
+        if self.app.is_static_file_request():
+            return self.call_in_executor(self.app.handle_static, self.ctx.request.path)
+
+        r = self.app.resolve()
+        if not isinstance(r, tuple):
+            return self.respond(r)
+
+        handler, args = r
+        args = args or {}
+        if inspect.iscoroutinefunction(handler):
+            try:
+                coroutine = handler(**args)
+            except Exception:
+                return self.respond(self.error())
+            # the task runs in a copy of this context, with `self.ctx` pushed.
+            self.then(coroutine, self.handled)
+        else:
+            self.call_in_executor(handler, **args)
+
+    def call_in_executor(self, func, *args, **kwargs):
+        call = functools.partial(self.call_in_context, func, *args, **kwargs)
+        self.then(self.loop.run_in_executor(None, call), self.handled)
+
+    def call_in_context(self, func, *args, **kwargs):
+        """ Run in a thread of the executor, with the request context pushed there. """
+        self.ctx.push()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.ctx.pop()
+
+    def handled(self, f):
+        try:
+            r = f.result()
+        except Exception:
+            r = self.error()
+        if _isawaitable(r):
+            return self.then(r, self.handled)
+        self.respond(r)
+
+    def error(self):
+        """ 500 response, called while handling the exception. """
+        FlangoException(500, self.ctx.response, lambda status, headers: None, self.app.DEBUG)()
+        return self.ctx.response
+
+    def respond(self, r):
+        response = self.app.make_response(r)
+        if response.stream is not None and self.scope['method'].upper() != 'HEAD':
+            # The headers set by a generator before its first chunk are sent too.
+            self.stream = response.stream
+            self.chunks = iter(self.stream)
+            call = functools.partial(self.call_in_context, self.next_chunk)
+            return self.then(self.loop.run_in_executor(None, call),
+                             lambda f: self.start_stream(response, f))
+        self.send_response(response)
+
+    def start_stream(self, response, f):
+        try:
+            chunk = f.result()
+        except Exception:
+            self.close_body()
+            self.chunks = None
+            return self.send_response(self.app.make_response(self.error()))
+        self.then(self.send({'type': 'http.response.start', 'status': response.status_code,
+                             'headers': self.header_list(response)}),
+                  lambda f: self.send_chunk(chunk))
+
+    def header_list(self, response):
+        return [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                for name, value in response.headerlist]
+
+    def send_response(self, response):
+        headers = self.header_list(response)
+        self.file = response.file
+        self.stream = response.stream
+        length = response.headers.get('Content-Length')
+        if self.scope['method'].upper() == 'HEAD':
+            body = b''
+            self.close_body()
+        else:
+            body = response.body
+
+        def send_body(f):
+            f.result()
+            if self.file is None:
+                self.then(self.send({'type': 'http.response.body', 'body': body}), self.sent)
+            elif 'http.response.zerocopysend' in self.scope.get('extensions', {}):
+                # the server sends the file itself, with sendfile.
+                message = {'type': 'http.response.zerocopysend', 'file': self.file}
+                if length is not None:
+                    # the file is positioned at the start of the range sent.
+                    message.update(offset=self.file.tell(), count=int(length))
+                self.then(self.send(message), self.sent)
+            else:
+                self.read_file()
+
+        self.then(self.send({'type': 'http.response.start', 'status': response.status_code,
+                             'headers': headers}), send_body)
+
+    def read_file(self):
+        """ Stream the file in blocks read on the executor. """
+        def send_block(f):
+            data = f.result()
+            self.then(self.send({'type': 'http.response.body', 'body': data, 'more_body': bool(data)}),
+                      lambda f: self.read_file() if data else self.sent(f))
+
+        self.then(self.loop.run_in_executor(None, self.file.read, STATIC_BLOCK_SIZE), send_block)
+
+    def read_stream(self):
+        """ Send the chunks of a streamed body, produced on the executor. """
+        call = functools.partial(self.call_in_context, self.next_chunk)
+        self.then(self.loop.run_in_executor(None, call), lambda f: self.send_chunk(f.result()))
+
+    def send_chunk(self, data):
+        self.then(self.send({'type': 'http.response.body', 'body': data, 'more_body': bool(data)}),
+                  lambda f: self.read_stream() if data else self.sent(f))
+
+    def next_chunk(self):
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return b''
+
+    def close_body(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def sent(self, f):
+        self.close_body()
+        self.ctx.pop()
+        f.result()
+        self.finish()
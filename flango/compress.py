@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+    flango.compress
+    ~~~~~~~~~~~~~~~
+
+    gzip compression of the responses, negotiated with `Accept-Encoding`.
+
+            app = Flango('blog', compression=Compression(level=6, min_size=1024))
+
+    Dynamic bodies of at least `min_size` bytes, and the streamed ones,
+    are compressed for each request. Static files are served from their prebuilt `.gz` sibling
+    when it is up to date (`gzip -k -9 style.css`), otherwise a gzipped
+    copy is built once. Both are kept until the file changes.
+
+    Images, videos, archives and fonts are already compressed, they are
+    always sent as they are.
+"""
+import os
+import zlib
+import threading
+import collections
+
+from .static import StaticEntry, load_entry
+
+
+# types which are already compressed, checked by prefix.
+COMPRESSED_TYPES = (
+    'image/', 'audio/', 'video/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/x-bzip2', 'application/x-xz', 'application/x-7z-compressed',
+    'application/x-rar-compressed', 'application/pdf', 'application/octet-stream',
+    'application/font-woff',
+)
+
+# compressible although they are images.
+TEXT_IMAGE_TYPES = ('image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon', 'image/bmp')
+
+
+def accepts_gzip(header):
+    """ Does the Accept-Encoding `header` accept gzip? """
+    gzip = star = None
+    for coding in header.split(','):
+        coding, _, params = coding.partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            gzip = q
+        elif coding == '*':
+            star = q
+    if gzip is not None:
+        return gzip > 0
+    return bool(star)
+
+
+def is_compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type.startswith(TEXT_IMAGE_TYPES):
+        return True
+    return not content_type.startswith(COMPRESSED_TYPES)
+
+
+def gzip_bytes(data, level=6):
+    """ `data` in the gzip format, without file name nor timestamp so the
+    same content always gives the same bytes.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class GzipStream(object):
+    """ gzip compressed chunks of a streamed body, each chunk is flushed
+    so the client gets it without waiting for the next one.
+    """
+    def __init__(self, stream, level=6):
+        self.stream = stream
+        self.level = level
+
+    def __iter__(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in self.stream:
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def add_vary(response, header='Accept-Encoding'):
+    vary = [value.strip() for value in response.headers.get('Vary', '').split(',') if value.strip()]
+    if header.lower() not in [value.lower() for value in vary]:
+        vary.append(header)
+        response.headers['Vary'] = ', '.join(vary)
+
+
+class Compression(object):
+    """ gzip settings of an application and the gzipped static files.
+
+    `level` is the zlib level of the dynamic bodies, static files are
+    compressed once with `static_level`. Gzipped static copies use at
+    most `max_size` bytes of memory, files bigger than `max_file_size`
+    are only sent gzipped from a `.gz` sibling.
+    """
+    def __init__(self, level=6, min_size=1024, static_level=9,
+                 max_size=32 * 1024 * 1024, max_file_size=1024 * 1024):
+        self.level = level
+        self.min_size = min_size
+        self.static_level = static_level
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        # bytes of the gzipped copies
+        self.size = 0
+        # abspath: (etag of the file, gzipped entry)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress_response(self, response, accept_encoding):
+        """ Gzip the body of a dynamic `response` when it's worth it. """
+        if response.status_code != 200 or response.file is not None:
+            return response
+        if 'Content-Encoding' in response.headers or not is_compressible(response.content_type):
+            return response
+        if 'Accept-Ranges' in response.headers:
+            # static file, sent gzipped by `static_entry` when it can be.
+            return response
+        add_vary(response)
+        if response.stream is not None:
+            # streamed bodies have no known size, they are always compressed.
+            if accepts_gzip(accept_encoding):
+                response.stream = GzipStream(response.stream, self.level)
+                response.headers['Content-Encoding'] = 'gzip'
+            return response
+        body = response.body
+        if len(body) < self.min_size or not accepts_gzip(accept_encoding):
+            return response
+        response.set_body(gzip_bytes(body, self.level))
+        response.headers['Content-Encoding'] = 'gzip'
+        if 'Content-Length' in response.headers:
+            response.headers['Content-Length'] = str(len(response.body))
+        return response
+
+    def static_entry(self, entry):
+        """ The gzipped entry of the static `entry`, None if it has none.
+
+        The result is kept until the ETag of `entry` changes, so neither
+        the `.gz` sibling is looked up nor the file compressed again.
+        """
+        with self._lock:
+            cached = self._entries.pop(entry.abspath, None)
+            if cached is not None:
+                if cached[0] == entry.etag:
+                    self._entries[entry.abspath] = cached
+                    return cached[1]
+                self.size -= self._size(cached[1])
+
+        gzipped = load_entry(entry.abspath + '.gz')
+        if gzipped is None or gzipped.mtime < entry.mtime:
+            gzipped = None
+            if entry.size <= self.max_file_size:
+                data = gzip_bytes(entry.read(0, entry.size), self.static_level)
+                gzipped = StaticEntry(entry.abspath, os.stat(entry.abspath), data)
+        if gzipped is not None:
+            gzipped.content_type = entry.content_type
+            gzipped.encoding = 'gzip'
+
+        with self._lock:
+            self._entries[entry.abspath] = (entry.etag, gzipped)
+            self.size += self._size(gzipped)
+            while self.size > self.max_size and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= self._size(evicted)
+        return gzipped
+
+    @staticmethod
+    def _size(entry):
+        return len(entry.data) if entry is not None and entry.data is not None else 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
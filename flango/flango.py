@@ -12,17 +12,43 @@ a ORM framework for sqlite3.
 
 import json
 import os
-import time
 import sys
+import inspect
+import itertools
+import binascii
 import traceback
 import threading
-import mimetypes
-from urllib import quote
+try:
+    from urllib import quote
+except ImportError:  # Python 3
+    from urllib.parse import quote
 
 from .server import ServerAdapter, WSGIRefServer
-from .template import Loader
-from .wrappers import Request, Response
-from .router import Router, RouterException
+from .template import Loader, Markup
+from .wrappers import Request, Response, FileWrapper
+from .router import Router, RouterException, MethodNotAllowed
+from .static import AssetManifest, load_entry, etag_matches, modified_since, parse_range, content_range, FileRange, \
+    MultipartRanges
+from .compress import accepts_gzip, is_compressible, add_vary
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+# max-age of the fingerprinted static files, one year.
+IMMUTABLE_MAX_AGE = 31536000
+
+# Block size of the static files streamed without sendfile.
+STATIC_BLOCK_SIZE = 64 * 1024
+
+# `async def` view functions need Python 3.5+.
+_isawaitable = getattr(inspect, 'isawaitable', lambda obj: False)
 
 
 class _Stack(threading.local):
@@ -55,6 +81,134 @@ class _Stack(threading.local):
         return 'app_stack with {0} applications'.format(len(self))
 
 
+class _ContextVarStack(object):
+    """Stack of request contexts kept in a context variable, so it is
+    local to the thread and to the asyncio task handling the request.
+    """
+    def __init__(self):
+        self._var = contextvars.ContextVar('flango_ctx_stack', default=())
+
+    def push(self, ctx):
+        self._var.set(self._var.get() + (ctx, ))
+
+    def pop(self):
+        stack = self._var.get()
+        if stack:
+            self._var.set(stack[:-1])
+
+    def top(self):
+        stack = self._var.get()
+        return stack[-1] if stack else None
+
+    def __len__(self):
+        return len(self._var.get())
+
+
+class _RequestContext(object):
+    """Request, response and session of the request being handled.
+
+    A context is pushed to `_ctx_stack` (local to the thread, and to the
+    asyncio task where context variables exist) when a request arrives
+    and popped when the server closes the response iterable, so
+    concurrent requests never see each other's objects.
+    """
+    def __init__(self, app, environ=None):
+        self.app = app
+        self.request = Request(environ)
+        self.response = Response(None)
+        self.session = self.request.cookies
+
+    def push(self):
+        _ctx_stack.push(self)
+
+    def pop(self):
+        if _ctx_stack.top() is self:
+            _ctx_stack.pop()
+
+
+class _ContextProxy(object):
+    """Forwards everything to the object returned by `lookup`,
+    which is resolved again on every access.
+    """
+    def __init__(self, lookup):
+        object.__setattr__(self, '_lookup', lookup)
+
+    def __getattr__(self, name):
+        return getattr(self._lookup(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._lookup(), name, value)
+
+    def __getitem__(self, key):
+        return self._lookup()[key]
+
+    def __setitem__(self, key, value):
+        self._lookup()[key] = value
+
+    def __delitem__(self, key):
+        del self._lookup()[key]
+
+    def __contains__(self, key):
+        return key in self._lookup()
+
+    def __iter__(self):
+        return iter(self._lookup())
+
+    def __len__(self):
+        return len(self._lookup())
+
+    def __repr__(self):
+        return repr(self._lookup())
+
+
+class _ClosingFile(object):
+    """File-like object given to `wsgi.file_wrapper`, the server closes it
+    once the file is sent, which also pops the request context.
+    """
+    def __init__(self, fileobj, ctx):
+        self._file = fileobj
+        self._ctx = ctx
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            self._ctx.pop()
+
+
+class _ClosingIterator(object):
+    """WSGI response iterable which pops the request context on `close`."""
+    def __init__(self, iterable, ctx, chunks=None):
+        self._iterable = iterable
+        self._ctx = ctx
+        # what is iterated over, when it is not `iterable` itself.
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._iterable if self._chunks is None else self._chunks)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            self._ctx.pop()
+
+
+def set_content_length(response):
+    """Content-Length of a body held in memory, so servers can keep
+    HTTP/1.0 connections alive and need no chunked transfer coding.
+    """
+    if response.stream is not None or response.file is not None or 'Content-Length' in response.headers:
+        return
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return
+    response.headers['Content-Length'] = str(len(response.body))
+
+
 class FlangoException(Exception):
     def __init__(self, code, response, server_handler, DEBUG=False):
         self._DEBUG = DEBUG
@@ -69,6 +223,7 @@ class FlangoException(Exception):
             body = self._response.status
 
         self._response.set_body(body)
+        set_content_length(self._response)
         self._server_handler(self._response.status, self._response.headerlist)
         return [self._response.body]
 
@@ -76,13 +231,13 @@ class FlangoException(Exception):
 class Flango(object):
     """Main object of this funny web frameWork."""
 
-    def __init__(self, pkg_name, template='template', static='static'):
-        # router
-        self._router = Router()
+    def __init__(self, pkg_name, template='template', static='static', route_cache_size=0,
+                 static_cache=None, compression=None, fingerprint_static=False):
+        # router, `route_cache_size` enables the cache of resolved routes.
+        self._router = Router(cache_size=route_cache_size)
 
-        # request and response
-        self._request = Request()
-        self._response = Response(None)
+        # request, response and session outside of any request
+        self._default_ctx = _RequestContext(self)
 
         # template
         self.package_name = pkg_name
@@ -90,18 +245,19 @@ class Flango(object):
         self.root_path = self._get_package_path(self.package_name).replace('\\', '\\\\')  # '\u' escape
 
         self.loader = Loader(os.sep.join([self.root_path, template]))
+        # names of flango and of the app module seen by the templates, see `template_namespace`.
+        self._template_namespace = None
 
         # static file
         self.static_folder = static
-        self.abspath = None
-        self.modified = None
         self.static_url_cache = {}
-
-        # session
-        self._session = self._request.cookies
-
-        # server handler
-        self._server_handler = None
+        # `flango.static.StaticCache` keeping the hot static files in memory.
+        self.static_cache = static_cache
+        # serve `/static/app.3f2a9c1d.js` forever cacheable, see `manifest`.
+        self.fingerprint_static = fingerprint_static
+        self._manifest = None
+        # `flango.compress.Compression` settings, responses are not compressed without it.
+        self.compression = compression
 
         # debug
         self.DEBUG = False
@@ -132,18 +288,39 @@ class Flango(object):
 
         return wrapper
 
+    def add_converter(self, name, converter):
+        """Register a custom converter for route arguments like "<name:arg>"."""
+        self._router.add_converter(name, converter)
+
+    @property
+    def _ctx(self):
+        """The context of the request handled by this thread."""
+        ctx = _ctx_stack.top()
+        if ctx is not None and ctx.app is self:
+            return ctx
+        return self._default_ctx
+
     @property
     def session(self):
-        return self._session
+        return self._ctx.session
 
-    def run(self, server=WSGIRefServer, host='localhost', port=8000, DEBUG=False):
+    def run(self, server=WSGIRefServer, host='localhost', port=8000, DEBUG=False, **options):
+        """Run the app with a ServerAdapter subclass, the extra keyword
+        arguments are passed to it, like `workers` of PreforkServer.
+        An instance of ServerAdapter is also accepted.
+        """
         self.DEBUG = DEBUG
+        if DEBUG:
+            # edited templates are picked up without a restart.
+            self.loader.auto_reload = True
         if isinstance(server, type) and issubclass(server, ServerAdapter):
-            server = server(host=host, port=port)
-        else:
+            server = server(host=host, port=port, **options)
+        elif not isinstance(server, ServerAdapter):
             raise RuntimeError('Server must be a subclass of ServerAdapter.')
 
-        print('running on {0}:{1}'.format(host, port))
+        if self.fingerprint_static:
+            self.manifest.build()
+        print('running on {0}:{1}'.format(server.host, server.port))
         try:
             server.run(self)
         except KeyboardInterrupt:
@@ -155,14 +332,46 @@ class Flango(object):
         return response
 
     def render(self, filename, **context):
-        app_namespace = sys.modules[self.package_name].__dict__
-        context.update(globals())
-        context.update(app_namespace)
-        return self.loader.load(filename).render(**context)
+        return self.loader.load(filename).render_context(context, self.template_namespace)
+
+    def stream(self, filename, **context):
+        """Render the template chunk by chunk, returning the generator
+        from a view streams the page while it's rendered.
+        """
+        return self.loader.load(filename).stream_context(context, self.template_namespace)
+
+    @property
+    def template_namespace(self):
+        """Names of flango and of the app module available to every
+        template, built on the first render. The variables given to
+        `render` hide them. Call `reset_template_namespace` after adding
+        names to the app module later on.
+        """
+        namespace = self._template_namespace
+        if namespace is None:
+            namespace = dict(globals())
+            namespace.update(getattr(sys.modules.get(self.package_name), '__dict__', {}))
+            # `Markup(...)` marks a string as safe HTML in the templates.
+            namespace.setdefault('Markup', Markup)
+            self._template_namespace = namespace
+        return namespace
+
+    def reset_template_namespace(self):
+        self._template_namespace = None
 
     def not_found(self):
         return Response(body='<h1>404 Not Found</h1>', code=404)
 
+    def method_not_allowed(self, allowed):
+        response = Response(body='<h1>405 Method Not Allowed</h1>', code=405)
+        response.headers['Allow'] = ', '.join(allowed)
+        return response
+
+    def options(self, allowed):
+        response = Response('', code=200)
+        response.headers['Allow'] = ', '.join(allowed)
+        return response
+
     def not_modified(self):
         response = Response('', code=304)
         # Don't need Content-Type here.
@@ -178,19 +387,21 @@ class Flango(object):
         # URLs for static files are constructed according to
         # current wsgi environ(HTTP_HOST, SERVER_NAME, etc.)
         if fn == self.static_folder and filename:
-            if filename in self.static_url_cache.keys():
-                return self.static_url_cache[filename]
-            else:
+            if self.fingerprint_static:
+                filename = self.manifest.get(filename) or filename
+            url = self.static_url_cache.get(filename)
+            # the cached URL is built for the host of a previous request.
+            if url is None or not url.startswith(self.url_root() + '/'):
                 url = self.construct_url(filename)
                 # Cache the URL
                 self.static_url_cache[filename] = url
-                return url
+            return url
         # Router function URLs are given by the router.
         if kwargs:
             return self._router.url_for(fn, **kwargs)
         return self._router.url_for(fn)
 
-    def construct_url(self, filename):
+    def url_root(self):
         environ = self._request.headers
         url = environ['wsgi.url_scheme'] + '://'
         if environ.get('HTTP_HOST'):
@@ -205,106 +416,245 @@ class Flango(object):
                 if environ['SERVER_PORT'] != '80':
                     url += ':' + environ['SERVER_PORT']
 
-        url += quote(environ.get('SCRIPT_NAME', ''))
-        if environ.get('QUERY_STRING'):
-            url += '?' + environ['QUERY_STRING']
+        return url + quote(environ.get('SCRIPT_NAME', ''))
 
-        url += '/' + '/'.join([self.static_folder, filename])
-        return url
+    def construct_url(self, filename):
+        return self.url_root() + '/' + '/'.join([self.static_folder, filename])
+
+    @property
+    def manifest(self):
+        """`flango.static.AssetManifest` of the static folder."""
+        if self._manifest is None:
+            self._manifest = AssetManifest(os.path.join(self.root_path, self.static_folder))
+        return self._manifest
 
     @property
     def request(self):
-        return self._request
+        return self._ctx.request
 
     @property
     def response(self):
-        return self._response
-
-    def get_content_type(self):
-        fallback_content_type = 'text/plain'
-        mime_type = mimetypes.guess_type(self.abspath)[0]
-        if mime_type:
-            return mime_type
-        else:
-            return fallback_content_type
-
-    def get_modified_time(self):
-        stats = os.stat(self.abspath)
-
-        last_modified_time = time.gmtime(stats.st_mtime)
-        return last_modified_time
-
-    def should_return_304(self):
-        if_modified_since_str = self._request.if_modified_since
-        if if_modified_since_str:
-            if_modified_since_time = time.strptime(if_modified_since_str, '%a, %d %b %Y %H:%M:%S %Z')
-            if if_modified_since_time >= self.modified:
-                return True
+        return self._ctx.response
+
+    # Older name of the properties.
+    _request = request
+    _response = response
+
+    def should_return_304(self, entry):
+        """Is the client copy of the static `entry` still valid?
+        If-None-Match takes precedence over If-Modified-Since.
+        """
+        if_none_match = self._request.if_none_match
+        if if_none_match:
+            return etag_matches(if_none_match, entry.etag)
+        if_modified_since = self._request.if_modified_since
+        if if_modified_since:
+            return not modified_since(if_modified_since, entry)
         return False
 
+    def get_ranges(self, entry):
+        """Ranges of `entry` requested by the client, None for the whole file."""
+        header = self._request.range
+        if not header or self._request.method.upper() not in ('GET', 'HEAD'):
+            return None
+        if_range = self._request.if_range
+        if if_range:
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if not etag_matches(if_range, entry.etag, weak=False):
+                    return None
+            elif if_range != entry.last_modified:
+                return None
+        return parse_range(header, entry.size)
+
     def is_static_file_request(self):
         return self._request.path.lstrip('/').startswith(self.static_folder)
 
     def handle_static(self, path):
-        response = Response(None)
-
         # This is the absolute path of a static file on the filesystem
-        self.abspath = self.root_path + path
+        abspath = self.root_path + path
+
+        filename = None
+        if self.fingerprint_static:
+            filename = self.manifest.resolve(path.lstrip('/')[len(self.static_folder) + 1:])
+        if filename is None:
+            return self.static_response(abspath)
+
+        response = self.static_response(os.path.join(self.manifest.directory, filename))
+        if response.status_code in (200, 206, 304):
+            # the content of a fingerprinted URL never changes.
+            response.headers['Cache-Control'] = 'public, max-age={0}, immutable'.format(IMMUTABLE_MAX_AGE)
+        return response
 
-        if not os.path.exists(self.abspath) or not os.path.isfile(self.abspath):
+    def static_response(self, abspath):
+        if self.static_cache is not None:
+            entry = self.static_cache.get(abspath)
+        else:
+            entry = load_entry(abspath)
+        if entry is None:
             return self.not_found()
 
-        content_type = self.get_content_type()
-        response.set_content_type(content_type)
-
-        self.modified = self.get_modified_time()
+        compressible = self.compression is not None and is_compressible(entry.content_type)
+        if compressible and not self._request.range and accepts_gzip(self._request.accept_encoding):
+            entry = self.compression.static_entry(entry) or entry
 
-        if self.should_return_304():
-            return self.not_modified()
+        if self.should_return_304(entry):
+            response = self.not_modified()
+            response.headers['ETag'] = entry.etag
+            if compressible:
+                add_vary(response)
+            return response
 
-        if 'Last-Modified' not in response.headers.keys():
-            last_modified_str = time.strftime(
-                '%a, %d %b %Y %H:%M:%S UTC', self.modified)
-            response.headers['Last-Modified'] = last_modified_str
+        response = Response(None)
+        response.set_content_type(entry.content_type)
+        response.headers['Last-Modified'] = entry.last_modified
+        response.headers['ETag'] = entry.etag
+        response.headers['Accept-Ranges'] = 'bytes'
+        if compressible:
+            add_vary(response)
+        if entry.encoding:
+            response.headers['Content-Encoding'] = entry.encoding
+
+        ranges = self.get_ranges(entry)
+        if ranges == []:
+            response.set_status(416)
+            response.headers['Content-Range'] = 'bytes */{0}'.format(entry.size)
+            response.set_body(b'')
+            response.headers['Content-Length'] = '0'
+            return response
+        if ranges:
+            return self.partial_content(response, entry, ranges)
+
+        if entry.data is not None:
+            # small cached file, served from memory.
+            response.set_body(entry.data)
+            response.headers['Content-Length'] = str(entry.size)
+        else:
+            # The file is streamed by dispatch, it's never held in memory.
+            response.set_file(entry.open(), entry.size)
+        return response
 
-        with open(self.abspath, 'r') as f:
-            response.set_body(body=(f.read()))
+    def partial_content(self, response, entry, ranges):
+        """206 response of the `(start, length)` ranges of `entry`."""
+        response.set_status(206)
+        if len(ranges) == 1:
+            start, length = ranges[0]
+            response.headers['Content-Range'] = content_range(start, length, entry.size)
+            if entry.data is not None:
+                response.set_body(entry.read(start, length))
+                response.headers['Content-Length'] = str(length)
+            else:
+                response.set_file(FileRange(entry.open(), start, length), length)
+            return response
+
+        boundary = binascii.hexlify(os.urandom(12)).decode('ascii')
+        body = MultipartRanges(entry, ranges, boundary, STATIC_BLOCK_SIZE)
+        response.set_content_type('multipart/byteranges; boundary=' + boundary)
+        # The parts are read from the disk while they are sent.
+        response.set_body(iter(body))
+        response.headers['Content-Length'] = str(body.length)
         return response
 
-    def handle_router(self):
+    def resolve(self):
+        """The handler and arguments of the current request, or a Response
+        when no handler is called: 404, 405 and the automatic OPTIONS.
+        """
         try:
-            handler, args = self._router.get(self._request.path, self._request.method)
+            return self._router.get(self._request.path, self._request.method)
+        except MethodNotAllowed as e:
+            # OPTIONS is answered automatically unless a handler is registered for it.
+            if self._request.method.upper() == 'OPTIONS':
+                return self.options(e.allowed)
+            return self.method_not_allowed(e.allowed)
         except RouterException:
             # No handler is found, assume it's a 404.
             return self.not_found()
 
-        return handler(**args) if args else handler()
+    def handle_router(self):
+        r = self.resolve()
+        if isinstance(r, Response):
+            return r
+
+        handler, args = r
+        r = handler(**args) if args else handler()
+        if _isawaitable(r):
+            # `async def` views run to completion on the loop of this thread.
+            r = self._run_coroutine(r)
+        return r
+
+    def _run_coroutine(self, awaitable):
+        loop = getattr(_loops, 'loop', None)
+        if loop is None:
+            loop = _loops.loop = asyncio.new_event_loop()
+        return loop.run_until_complete(awaitable)
+
+    def make_response(self, r):
+        """Turn what a handler returned into the response of the current request."""
+        ctx = self._ctx
+        # Static files, 302, 304 and 404
+        if isinstance(r, Response):
+            ctx.response = r
+        else:
+            # Normal html
+            ctx.response.set_body(body=r)
+            ctx.response.set_status(200)
+        if self.compression is not None:
+            self.compression.compress_response(ctx.response, ctx.request.accept_encoding)
+        set_content_length(ctx.response)
+        return ctx.response
 
     def __call__(self, environ, start_response):
-        self._response = Response(None)
-        self._request = Request(None)
-        self._server_handler = start_response
-        self._request.bind(environ)
+        ctx = _RequestContext(self, environ)
+        ctx.push()
+        try:
+            return self.dispatch(ctx, start_response)
+        except Exception:
+            ctx.pop()
+            raise
 
+    def dispatch(self, ctx, start_response):
+        """Return the WSGI response iterable, closing it pops `ctx`."""
         if self.is_static_file_request():
-            r = self.handle_static(self._request.path)
+            r = self.handle_static(ctx.request.path)
         else:
             try:
                 r = self.handle_router()
             except Exception:
-                return FlangoException(500, self._response, self._server_handler, self.DEBUG)()
+                return _ClosingIterator(FlangoException(500, ctx.response, start_response, self.DEBUG)(), ctx)
 
-        # Static files, 302, 304 and 404
-        if isinstance(r, Response):
-            self._response = r
-            self._server_handler(r.status, r.headerlist)
-            return [r.body]
-
-        # Normal html
-        self._response.set_body(body=r)
-        self._response.set_status(200)
-        start_response(self._response.status, self._response.headerlist)
-        return [self._response.body]
+        response = self.make_response(r)
+        if response.stream is not None and ctx.request.method.upper() != 'HEAD':
+            # The headers set by a generator before its first chunk are sent too.
+            chunks = iter(response.stream)
+            try:
+                first = [next(chunks)]
+            except StopIteration:
+                first = []
+            except Exception:
+                response.stream.close()
+                return _ClosingIterator(FlangoException(500, ctx.response, start_response, self.DEBUG)(), ctx)
+            start_response(response.status, response.headerlist)
+            # Servers send each chunk once produced, without Content-Length.
+            return _ClosingIterator(response.stream, ctx, itertools.chain(first, chunks))
+
+        start_response(response.status, response.headerlist)
+        if ctx.request.method.upper() == 'HEAD':
+            if response.file is not None:
+                response.file.close()
+            if response.stream is not None:
+                response.stream.close()
+            return _ClosingIterator([b''], ctx)
+        if response.file is not None:
+            # Servers send the file with os.sendfile or in blocks.
+            file_wrapper = ctx.request.environ.get('wsgi.file_wrapper', FileWrapper)
+            return file_wrapper(_ClosingFile(response.file, ctx), STATIC_BLOCK_SIZE)
+        return _ClosingIterator([response.body], ctx)
+
+    def asgi(self, scope, receive, send):
+        """ASGI (version 3) entry point next to the WSGI `__call__`,
+        for example: `uvicorn --interface asgi3 blog:app.asgi`.
+        """
+        from .asgi import handle
+        return handle(self, scope, receive, send)
 
 
 """
@@ -314,13 +664,25 @@ default methods and properties
 # global app stack.
 app_stack = _Stack()
 
+# contexts of the requests handled by the current thread or task.
+_ctx_stack = _ContextVarStack() if contextvars else _Stack()
+
+# event loops running `async def` views of WSGI requests, one per thread.
+_loops = threading.local()
+
 # default app
 default_app = app_stack.top()
 
 if not default_app:  # hack for shell
     default_app = Flango('/')
 
-# shell
-request = app_stack.top().request
-response = app_stack.top().response
-session = app_stack.top().session
\ No newline at end of file
+
+def _current_app():
+    ctx = _ctx_stack.top()
+    return ctx.app if ctx is not None else default_app
+
+
+# shell, these follow the request handled by the current thread.
+request = _ContextProxy(lambda: _current_app().request)
+response = _ContextProxy(lambda: _current_app().response)
+session = _ContextProxy(lambda: _current_app().session)
\ No newline at end of file
@@ -15,6 +15,17 @@
     "/author/<username>" which will match URLs "http://hostname:port/author/Jone" or "http://hostname:port/author/Bob",
     "/post/<int:id>" which will match URLs "http://hostname:port/post/1" or "http://hostname:port/post/20".
 
+    A rule may hold any number of arguments, the type before the colon names
+    a converter: "string" (the default), "int", "float", "path", "uuid" and "slug".
+    The view function receives the converted values:
+
+                        >>>router.register('/archive/<int:year>/<int:month>', archive, ['GET'])
+                        >>>print router.get('/archive/2015/10')
+                        Out: (<function archive at 0x0000000007BE9230>, {'year': 2015, 'month': 10})
+
+    Custom converters subclass `BaseConverter` and are registered with
+    `router.add_converter('name', NameConverter)`.
+
     Then we can get the function with the registered path:
 
                         >>>print router.get('/hello/world')
@@ -27,20 +38,313 @@
 """
 
 import re
+import uuid
+import threading
+import collections
 
 
 class RouterException(Exception):
     pass
 
 
-class Router(object):
+class MethodNotAllowed(RouterException):
+    """ The path matches a rule, but not with the requested method,
+    `allowed` is the list of methods the path accepts.
+    """
+    def __init__(self, method, allowed):
+        super(MethodNotAllowed, self).__init__(
+            'Request method: "{0}" is not allowed in this app.'.format(method))
+        self.allowed = allowed
+
+
+class BaseConverter(object):
+    """ Base class for the argument converters of routing rules.
+
+    `regex` is the regular expression fragment matched in the URL,
+    `to_python` turns the matched string into the argument passed to
+    the view function, `to_url` does the reverse for `Router.url_for`.
+    A converter whose regex can match '/' sets `multi_segment`.
+    """
+    regex = r'\w+'
+    multi_segment = False
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return str(value)
+
+
+class StringConverter(BaseConverter):
+    pass
+
+
+class IntConverter(BaseConverter):
+    regex = r'\d+'
+
+    def to_python(self, value):
+        return int(value)
+
+    def to_url(self, value):
+        return str(int(value))
+
+
+class FloatConverter(BaseConverter):
+    regex = r'\d+\.\d+'
+
+    def to_python(self, value):
+        return float(value)
+
+    def to_url(self, value):
+        return repr(float(value))
+
+
+class PathConverter(BaseConverter):
+    regex = r'[^/].*'
+    multi_segment = True
+
+
+class UUIDConverter(BaseConverter):
+    regex = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+
+    def to_python(self, value):
+        return uuid.UUID(value)
+
+
+class SlugConverter(BaseConverter):
+    regex = r'[-a-zA-Z0-9_]+'
+
+
+# The default converters, a `Router` copies them so that custom
+# converters can be added per router with `Router.add_converter`.
+DEFAULT_CONVERTERS = {
+    'string': StringConverter,
+    'int': IntConverter,
+    'float': FloatConverter,
+    'path': PathConverter,
+    'uuid': UUIDConverter,
+    'slug': SlugConverter,
+}
+
+# argument of a rule: "<name>" or "<type:name>"
+_arg_pattern = re.compile(r'<(?:(?P<type>\w+):)?(?P<name>\w+)>')
+
+
+class Rule(object):
+    """ A routing rule compiled at registration time.
+
+    The path is split into segments, a segment is either a literal
+    string or a compiled regular expression built from the converters
+    of its arguments, so dispatching walks the requested path only once.
+    """
+    def __init__(self, path, func, converters=None):
+        if converters is None:
+            converters = DEFAULT_CONVERTERS
+        if not path.startswith('/'):
+            raise RouterException('Router rules: "{0}" can not be accept.'.format(path))
+
+        self.path = path
+        self.func = func
+        # argument names in order, and key: argument name, value: converter
+        self.args = []
+        self.converters = {}
+
+        # every segment is a list of literal strings and argument names.
+        parts = [[]]
+        # URL builder for reverse routing: a format string like "/post/{id}".
+        self.url_format = '/'
+
+        def add_text(text):
+            if '<' in text or '>' in text:
+                raise RouterException('Router rules: "{0}" can not be accept.'.format(path))
+            pieces = text.split('/')
+            parts[-1].append(pieces[0])
+            parts.extend([piece] for piece in pieces[1:])
+            self.url_format += text.replace('{', '{{').replace('}', '}}')
+
+        pos = 1
+        for token in _arg_pattern.finditer(path, pos):
+            add_text(path[pos:token.start()])
+            arg_type, name = token.group('type') or 'string', token.group('name')
+            if arg_type not in converters:
+                raise RouterException('Router rules: type "{0}" is not supported.'.format(arg_type))
+            if name in self.converters:
+                raise RouterException('Router rules: argument "{0}" is duplicated.'.format(name))
+
+            self.args.append(name)
+            self.converters[name] = converters[arg_type]()
+            parts[-1].append((name, ))
+            self.url_format += '{%s}' % name
+            pos = token.end()
+        add_text(path[pos:])
+
+        self.segments = [self._compile_segment(segment) for segment in parts]
+
+    def _compile_segment(self, segment):
+        """ A segment without arguments stays a literal string, otherwise it
+        becomes a `(compiled pattern, multi_segment)` pair.
+        """
+        if not any(isinstance(part, tuple) for part in segment):
+            return ''.join(segment)
+
+        regex, multi_segment = [], False
+        for part in segment:
+            if not isinstance(part, tuple):
+                regex.append(re.escape(part))
+            else:
+                converter = self.converters[part[0]]
+                regex.append('(?P<{0}>{1})'.format(part[0], converter.regex))
+                multi_segment = multi_segment or converter.multi_segment
+        return re.compile(''.join(regex) + '$'), multi_segment
 
+    @property
+    def is_static(self):
+        return not self.args
+
+    def to_python(self, args):
+        """ Convert the matched strings to the arguments of the function. """
+        try:
+            return dict((name, self.converters[name].to_python(value)) for name, value in args.items())
+        except ValueError:
+            raise RouterException('Router rules: "{0}" can not be accept.'.format(self.path))
+
+    def build(self, **kwargs):
+        """ Build the URL of this rule with the given arguments. """
+        if not self.args:
+            return self.url_format
+        try:
+            values = dict((name, self.converters[name].to_url(kwargs[name])) for name in self.args)
+        except KeyError:
+            raise RouterException('Required an argument.')
+        return self.url_format.format(**values)
+
+
+class _Node(object):
+    """ Node of the prefix tree which holds the dynamic rules. """
     def __init__(self):
-        # key: path pattern, value: function and args
+        # literal segment -> child node
+        self.children = {}
+        # (compiled segment pattern, multi_segment, child node), in registration order.
+        self.patterns = []
+        # the rules which end here, key: method, value: rule
+        self.value = None
+
+    def insert(self, segments):
+        node = self
+        for segment in segments:
+            if not isinstance(segment, tuple):
+                node = node.children.setdefault(segment, _Node())
+                continue
+            for pattern, multi_segment, child in node.patterns:
+                if pattern.pattern == segment[0].pattern:
+                    node = child
+                    break
+            else:
+                child = _Node()
+                node.patterns.append(segment + (child, ))
+                node = child
+        return node
+
+    def match(self, segments, index, args, method, matched):
+        """ Return the rule of `method` for `segments[index:]` or None,
+        captured arguments are collected into `args` and the method
+        tables of the nodes matching the path into `matched`.
+        """
+        if index == len(segments):
+            return _select(self.value, method, matched)
+
+        segment = segments[index]
+        child = self.children.get(segment)
+        if child is not None:
+            value = child.match(segments, index + 1, args, method, matched)
+            if value is not None:
+                return value
+
+        for pattern, multi_segment, child in self.patterns:
+            if multi_segment:
+                # try the shortest run of segments first, so that the more
+                # specific rules like "/<path:p>/edit" win over "/<path:p>".
+                ends = range(index + 1, len(segments) + 1)
+            else:
+                ends = (index + 1, )
+            for end in ends:
+                token = pattern.match('/'.join(segments[index:end]))
+                if token:
+                    value = child.match(segments, end, args, method, matched)
+                    if value is not None:
+                        args.update(token.groupdict())
+                        return value
+        return None
+
+
+def _select(methods, method, matched):
+    """ The rule of `method` in the method table of a node, HEAD is
+    answered by the GET rule.
+    """
+    if methods is None:
+        return None
+    rule = methods.get(method)
+    if rule is None and method == 'HEAD':
+        rule = methods.get('GET')
+    if rule is None:
+        matched.append(methods)
+    return rule
+
+
+class _Table(object):
+    """ Dispatch structure: static paths are dispatched with a single dict
+    lookup, the others walk the prefix tree segment by segment. Every
+    node holds the rules of all the methods, so a single walk gives the
+    rule and, when there is none, the methods the path accepts.
+    """
+    def __init__(self):
+        # key: path, value: node holding the rules
+        self.static = {}
+        self.tree = _Node()
+
+    def node(self, rule):
+        """ The node which holds the rules of `rule.path`, created if needed. """
+        if rule.is_static:
+            node = self.static.setdefault(rule.path, _Node())
+        else:
+            node = self.tree.insert(rule.segments)
+        if node.value is None:
+            node.value = {}
+        return node
+
+    def match(self, path, method):
+        """ Return `(rule, args, matched)` for the path, rule is None if
+        no rule of `method` matches it, `matched` lists the method
+        tables of the rules matching the path.
+        """
+        matched = []
+        node = self.static.get(path)
+        if node is not None:
+            rule = _select(node.value, method, matched)
+            if rule is not None:
+                return rule, None, matched
+        args = {}
+        return self.tree.match(path.split('/'), 1, args, method, matched), args, matched
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class Router(object):
+    """ `cache_size` enables a LRU cache of resolved routes keyed by
+    (method, path) holding at most `cache_size` entries, the cache is
+    cleared whenever a rule is registered.
+    """
+    def __init__(self, cache_size=0):
+        # key: (method, path), value: compiled rule
         self.rules = {}
-        self.url_pattern = re.compile(
-            r'(?P<prefix>(/\w*)+)(<((?P<type>\w+):)?(?P<args>\w+)>)?'
-        )
+        # the rules of every path by method, also gives the allowed
+        # methods of 405 responses.
+        self._table = _Table()
+        # key: function, value: the rule used for reverse routing
+        self._endpoints = {}
+        # key: type name used in rules, value: converter class
+        self.converters = dict(DEFAULT_CONVERTERS)
         self.methods = {
             'GET': [],
             'POST': [],
@@ -48,61 +352,116 @@ class Router(object):
             'DELETE': []
         }
 
+        # resolution cache, key: (method, path), value: (function, args)
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+
     def register(self, path, func, methods):
         if not callable(func):
             raise RouterException('Router only accept callable object.')
 
+        rule = Rule(path, func, self.converters)
+        node = self._table.node(rule)
+
         for method in methods:
-            self.methods[method].append(func)
+            method = method.upper()
+            self.methods.setdefault(method, []).append(func)
 
-        token = self.url_pattern.match(path)
-        if not token:
-            raise RouterException('Router rules: "{0}" can not be accept.'.format(path))
+            replaced = self.rules.get((method, path))
+            if replaced is not None and self._endpoints.get(replaced.func) is replaced:
+                del self._endpoints[replaced.func]
+            self.rules[(method, path)] = rule
 
-        path_pattern = token.group('prefix')
-        if token.group('type'):
-            assert token.group('type') == 'int'
-            path_pattern = r'{0}(?P<args>\d+)$'.format(path_pattern)
-        elif token.group('args'):
-            path_pattern = r'{0}(?P<args>\w+)$'.format(path_pattern)
-        else:
-            path_pattern = r'{0}$'.format(path_pattern)
+            node.value[method] = rule
 
-        self.rules[re.compile(path_pattern)] = (func, token.group('args')) if token.group('args') else (func, None)
+        self._endpoints.setdefault(func, rule)
+        self.clear_cache()
+
+    def add_converter(self, name, converter):
+        """ Register a converter class for rules like "<name:arg>",
+        it only affects the rules registered afterwards.
+        """
+        if not (isinstance(converter, type) and issubclass(converter, BaseConverter)):
+            raise RouterException('Converter must be a subclass of BaseConverter.')
+        self.converters[name] = converter
 
     def __call__(self, path, method='GET'):
         return self.get(path, method)
 
     def get(self, path, method='GET'):
-        for rule, value in self.rules.iteritems():
-            token = rule.match(path)
-            if token:
-                func, args = value
-                method = method.upper()
-                if self.methods.get(method) is None:
-                    raise RouterException('Request method: "{0}" is not allowed in this app.'.format(method))
-
-                if args:
-                    return func, {args: token.group('args')}
-                else:
-                    return func, None
-        else:
+        method = method.upper()
+        if not self.cache_size:
+            return self._resolve(path, method)
+
+        key = (method, path)
+        with self._cache_lock:
+            value = self._cache.pop(key, None)
+            if value is not None:
+                self._cache[key] = value
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+        if value is None:
+            # failed resolutions raise and are never cached.
+            value = self._resolve(path, method)
+            with self._cache_lock:
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        func, args = value
+        return func, dict(args) if args else None
+
+    def cache_info(self):
+        """ Statistics of the resolution cache, like `functools.lru_cache`. """
+        return CacheInfo(self.cache_hits, self.cache_misses, self.cache_size, len(self._cache))
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _resolve(self, path, method):
+        rule, args, matched = self._table.match(path, method)
+        if rule is None:
+            # only paths matched by another method lead to a 405.
+            if matched:
+                raise MethodNotAllowed(method, _allow(matched))
             raise RouterException('Router rules: "{0}" can not be accept.'.format(path))
 
-    def url_for(self, func, **kwargs):
-        for rule, value in self.rules.iteritems():
-            function, args = value
-            if function != func:
-                continue
-            if args:
-                if args not in kwargs.keys():
-                    raise RouterException('Required an argument.')
+        return rule.func, rule.to_python(args) if args else None
 
-                return rule.pattern.replace('(?P<args>\d+)$', str(kwargs[args])).replace('(?P<args>\w+)$', str(kwargs[args]))
-            return rule.pattern.rstrip('$')
-        else:
+    def allowed_methods(self, path):
+        """ Methods accepted by `path` for the "Allow" header,
+        empty if no rule matches the path.
+        """
+        # no rule has an empty method, every matching node is collected.
+        _, _, matched = self._table.match(path, '')
+        return _allow(matched) if matched else []
+
+    def url_for(self, func, **kwargs):
+        try:
+            rule = self._endpoints.get(func)
+        except TypeError:
+            rule = None
+        if rule is None:
             raise RouterException("Callable object doesn't match any routing rule.")
+        return rule.build(**kwargs)
 
     def all_callables(self):
         """ All registered functions. """
-        return [func for func, _ in self.rules.values()]
\ No newline at end of file
+        return list(set(rule.func for rule in self.rules.values()))
+
+
+def _allow(matched):
+    """ The sorted methods of the method tables in `matched`. """
+    allowed = set()
+    for methods in matched:
+        allowed.update(methods)
+    if 'GET' in allowed:
+        allowed.add('HEAD')
+    allowed.add('OPTIONS')
+    return sorted(allowed)
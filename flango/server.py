@@ -6,7 +6,69 @@ Method flango.run accept a subclass of ServerAdapter, create a server
 instance and run applications using the run interface provided by ServerAdapter.
 
 So the server must implement the interface 'run' provided by ServerAdapter.
+
+Besides the single threaded `WSGIRefServer`, there are two adapters which
+use all the cores with the standard library only:
+
+    `ThreadedWSGIServer` serves requests with a fixed pool of threads,
+
+            app.run(server=ThreadedWSGIServer, threads=16)
+
+    `PreforkServer` forks worker processes sharing the listening socket,
+
+            app.run(server=PreforkServer, workers=4, max_requests=1000)
+
+`AsyncioServer` accepts and parses HTTP/1.1 on an asyncio event loop with
+keep-alive and pipelining, and runs the WSGI application on a thread pool,
+so idle connections cost no thread (requires Python 3.4+).
 """
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import socket
+import threading
+import traceback
+import collections
+import multiprocessing
+from io import BytesIO
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler, ServerHandler
+
+from .wrappers import FileWrapper
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    asyncio = None
+
+if bytes is str:
+    from urllib import unquote as _unquote
+
+    def _native(data):
+        return data
+
+    def _bytes(s):
+        return s
+else:
+    from urllib.parse import unquote_to_bytes
+
+    # WSGI strings are "bytes as latin-1 unicode" on Python 3.
+    def _native(data):
+        return data.decode('latin-1')
+
+    def _bytes(s):
+        return s.encode('latin-1')
+
+    def _unquote(path):
+        return unquote_to_bytes(path).decode('latin-1')
 
 
 class ServerAdapter(object):
@@ -21,9 +83,729 @@ class ServerAdapter(object):
         raise NotImplementedError
 
 
+class _SendfileServerHandler(ServerHandler):
+    """ wsgiref handler sending the files of `wsgi.file_wrapper` with
+    `os.sendfile`: the data goes from the page cache to the socket
+    without being copied through Python.
+    """
+    wsgi_file_wrapper = FileWrapper
+
+    def sendfile(self):
+        if not hasattr(os, 'sendfile'):
+            return False
+        try:
+            fd = self.result.fileno()
+            out = self.stdout.fileno()
+        except (AttributeError, OSError, IOError, ValueError):
+            return False
+
+        if not self.headers_sent:
+            self.send_headers()
+        self.stdout.flush()
+
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        remain = self.headers.get('Content-Length')
+        remain = int(remain) if remain is not None else None
+        while remain is None or remain > 0:
+            count = min(remain, 1 << 30) if remain is not None else 1 << 30
+            sent = os.sendfile(out, fd, offset, count)
+            if sent == 0:
+                break
+            offset += sent
+            self.bytes_sent += sent
+            if remain is not None:
+                remain -= sent
+        return True
+
+
+class RequestHandler(WSGIRequestHandler):
+    """ WSGIRequestHandler running the application with `_SendfileServerHandler`. """
+
+    def handle(self):
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+
+        handler = _SendfileServerHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ())
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+
 class WSGIRefServer(ServerAdapter):
 
     def run(self, app):
         from wsgiref.simple_server import make_server
-        httpd = make_server(self.host, self.port, app)
+        httpd = make_server(self.host, self.port, app, handler_class=RequestHandler)
         httpd.serve_forever()
+
+
+class _ThreadPoolWSGIServer(WSGIServer):
+    """ WSGIServer handing the accepted connections to a fixed number of
+    worker threads through a bounded queue, unlike `ThreadingMixIn` which
+    starts a thread per request.
+    """
+    daemon_threads = True
+
+    def start_workers(self, threads, backlog):
+        self._requests = queue.Queue(backlog)
+        self._workers = []
+        for _ in range(threads):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = self.daemon_threads
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        # blocks the accepting thread while all the workers are busy
+        # and the queue is full.
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        WSGIServer.server_close(self)
+        for _ in self._workers:
+            self._requests.put(None)
+
+
+class ThreadedWSGIServer(ServerAdapter):
+    """ wsgiref based server with a pool of `threads` worker threads,
+    at most `backlog` accepted connections wait for a free worker.
+    """
+    def __init__(self, host='127.0.0.1', port=8000, threads=10, backlog=128,
+                 handler_class=RequestHandler):
+        super(ThreadedWSGIServer, self).__init__(host, port)
+        self.threads = threads
+        self.backlog = backlog
+        self.handler_class = handler_class
+        self.httpd = None
+
+    def run(self, app):
+        self.httpd = make_server(self.host, self.port, app,
+                                 server_class=_ThreadPoolWSGIServer, handler_class=self.handler_class)
+        self.httpd.start_workers(self.threads, self.backlog)
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+
+class _PreforkWSGIServer(WSGIServer):
+    """ WSGIServer of a prefork worker, the listening socket is shared by
+    all the workers so it is non-blocking: a worker losing the race for a
+    connection gets back to its loop instead of hanging in `accept`.
+    """
+    requests_handled = 0
+
+    def get_request(self):
+        request, client_address = WSGIServer.get_request(self)
+        request.setblocking(True)
+        return request, client_address
+
+    def process_request(self, request, client_address):
+        self.requests_handled += 1
+        WSGIServer.process_request(self, request, client_address)
+
+
+class _Worker(object):
+    def __init__(self, pid, pipe):
+        self.pid = pid
+        # read end of the heartbeat pipe
+        self.pipe = pipe
+        self.last_beat = time.time()
+
+
+class PreforkServer(ServerAdapter):
+    """ Forks `workers` processes which accept connections on the socket
+    opened by the master process.
+
+    - the master process respawns the workers which exit,
+    - a worker exits after `max_requests` requests when it is not 0,
+    - the workers send a heartbeat through a pipe, a worker which keeps
+      silent for `timeout` seconds is killed and replaced,
+    - SIGHUP restarts the workers gracefully: they finish the current
+      request before exiting, SIGTERM and SIGINT stop the server.
+    """
+    def __init__(self, host='127.0.0.1', port=8000, workers=None, max_requests=0, timeout=30,
+                 graceful_timeout=10, handler_class=RequestHandler):
+        super(PreforkServer, self).__init__(host, port)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.handler_class = handler_class
+        self.httpd = None
+        # key: pid, value: _Worker
+        self._workers = {}
+        self._running = False
+        self._restart = False
+
+    def run(self, app):
+        self.httpd = make_server(self.host, self.port, app,
+                                 server_class=_PreforkWSGIServer, handler_class=self.handler_class)
+        self.httpd.socket.setblocking(False)
+        # idle workers wake up at least once a second for the heartbeat.
+        self.httpd.timeout = 1
+
+        self._running = True
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+        try:
+            while self._running:
+                self._spawn_workers()
+                self._wait_heartbeats()
+                self._reap_workers()
+                self._kill_silent_workers()
+                if self._restart:
+                    self._restart = False
+                    self._signal_workers(signal.SIGTERM)
+        finally:
+            self._stop_workers()
+            self.httpd.server_close()
+
+    def _handle_stop(self, signum, frame):
+        self._running = False
+
+    def _handle_restart(self, signum, frame):
+        self._restart = True
+
+    def _spawn_workers(self):
+        while self._running and len(self._workers) < self.workers:
+            read_end, write_end = os.pipe()
+            # a busy master must never block the heartbeat of a worker.
+            self._set_nonblocking(write_end)
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_end)
+                for worker in self._workers.values():
+                    os.close(worker.pipe)
+                code = 0
+                try:
+                    self._work(write_end)
+                except Exception:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os._exit(code)
+            os.close(write_end)
+            self._workers[pid] = _Worker(pid, read_end)
+
+    @staticmethod
+    def _set_nonblocking(fd):
+        if hasattr(os, 'set_blocking'):
+            os.set_blocking(fd, False)
+            return
+        # imported here, there is no fcntl on Windows.
+        import fcntl
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def _work(self, pipe):
+        """ Main loop of a worker process. """
+        state = {'alive': True}
+
+        def stop(signum, frame):
+            state['alive'] = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        while state['alive']:
+            try:
+                os.write(pipe, b'.')
+            except OSError as e:
+                if e.errno == errno.EPIPE:
+                    # the master is gone.
+                    return
+                if e.errno != errno.EAGAIN:
+                    raise
+            try:
+                self.httpd.handle_request()
+            except (select.error, socket.error, OSError) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+            if self.max_requests and self.httpd.requests_handled >= self.max_requests:
+                return
+
+    def _wait_heartbeats(self):
+        pipes = dict((worker.pipe, worker) for worker in self._workers.values())
+        try:
+            readable, _, _ = select.select(list(pipes), [], [], 1.0)
+        except (select.error, OSError) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            return
+        now = time.time()
+        for fd in readable:
+            try:
+                os.read(fd, 4096)
+            except OSError:
+                continue
+            pipes[fd].last_beat = now
+
+    def _reap_workers(self):
+        while self._workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    break
+                raise
+            if pid == 0:
+                break
+            worker = self._workers.pop(pid, None)
+            if worker is not None:
+                os.close(worker.pipe)
+
+    def _kill_silent_workers(self):
+        deadline = time.time() - self.timeout
+        for worker in list(self._workers.values()):
+            if worker.last_beat < deadline:
+                sys.stderr.write('Worker {0} timed out, killing it.\n'.format(worker.pid))
+                self._kill(worker.pid, signal.SIGKILL)
+
+    def _signal_workers(self, signum):
+        for pid in list(self._workers):
+            self._kill(pid, signum)
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def _stop_workers(self):
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while self._workers and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(0.1)
+        self._signal_workers(signal.SIGKILL)
+        while self._workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    break
+                if e.errno != errno.EINTR:
+                    raise
+                continue
+            worker = self._workers.pop(pid, None)
+            if worker is not None:
+                os.close(worker.pipe)
+
+
+class _BadRequest(Exception):
+    def __init__(self, status):
+        super(_BadRequest, self).__init__(status)
+        self.status = status
+
+
+class _ConnectionLost(Exception):
+    pass
+
+
+class _HTTPProtocol(object):
+    """ asyncio protocol of one HTTP/1.1 connection.
+
+    Requests are parsed on the event loop, the complete ones wait in
+    `self.requests` (pipelining) and are handed one at a time to a thread
+    of the pool which runs the WSGI application, the responses are thus
+    written in order. The worker thread gives every write back to the
+    event loop and waits while the transport is paused.
+    """
+    def __init__(self, server, app):
+        self.server = server
+        self.app = app
+        self.loop = server.loop
+        self.transport = None
+        # grows in place, the parsed requests are deleted from its start.
+        self.buffer = bytearray()
+        # parsed request waiting for its body: (environ, content length)
+        self.pending = None
+        # environs, and a `_BadRequest` answered after the requests before it.
+        self.requests = collections.deque()
+        # a malformed request was received, the rest of the input is ignored.
+        self.failed = False
+        self.busy = False
+        self.eof = False
+        self.idle_timer = None
+        self.writable = threading.Event()
+        self.writable.set()
+
+    def connection_made(self, transport):
+        self.server.connections.add(self)
+        self.transport = transport
+        self.peername = transport.get_extra_info('peername') or ('', 0)
+        self.sockname = transport.get_extra_info('sockname') or ('', 0)
+        self._start_idle_timer()
+
+    def connection_lost(self, exc):
+        self.server.connections.discard(self)
+        self.transport = None
+        self._cancel_idle_timer()
+        # wake up a worker thread waiting to write.
+        self.writable.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def data_received(self, data):
+        if self.failed:
+            return
+        self.buffer += data
+        try:
+            self._parse()
+        except _BadRequest as e:
+            # answered in order, after the responses of the previous requests.
+            self.failed = True
+            del self.buffer[:]
+            self.requests.append(e)
+            self.transport.pause_reading()
+        if len(self.requests) >= self.server.max_pipeline:
+            self.transport.pause_reading()
+        self._process_next()
+
+    def eof_received(self):
+        self.eof = True
+        if not self.busy and not self.requests:
+            self.transport.close()
+        # keep the transport open to answer the pending requests.
+        return True
+
+    def _start_idle_timer(self):
+        self._cancel_idle_timer()
+        self.idle_timer = self.loop.call_later(self.server.keep_alive_timeout, self._close)
+
+    def _cancel_idle_timer(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def _close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def _write_error(self, status):
+        if self.transport is not None:
+            self.transport.write(_bytes('HTTP/1.1 {0}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.format(status)))
+            self.transport.close()
+
+    def _parse(self):
+        """ Move the complete requests of the buffer to `self.requests`. """
+        while True:
+            if self.pending is None:
+                end = self.buffer.find(b'\r\n\r\n')
+                if end < 0:
+                    if len(self.buffer) > self.server.max_header_size:
+                        raise _BadRequest('431 Request Header Fields Too Large')
+                    return
+                head = _native(bytes(self.buffer[:end]))
+                del self.buffer[:end + 4]
+                self.pending = self._parse_head(head)
+                if self.pending[0].get('HTTP_EXPECT', '').lower() == '100-continue' and \
+                        len(self.buffer) < self.pending[1]:
+                    self.transport.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+            environ, length = self.pending
+            if len(self.buffer) < length:
+                return
+            environ['wsgi.input'] = BytesIO(bytes(self.buffer[:length]))
+            del self.buffer[:length]
+            self.pending = None
+            self.requests.append(environ)
+
+    def _parse_head(self, head):
+        lines = head.split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise _BadRequest('400 Bad Request')
+        if not version.startswith('HTTP/1.'):
+            raise _BadRequest('505 HTTP Version Not Supported')
+
+        path, _, query = target.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': _unquote(path),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.server.host,
+            'SERVER_PORT': str(self.sockname[1]),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': self.peername[0],
+            'REMOTE_PORT': str(self.peername[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileWrapper,
+        }
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise _BadRequest('400 Bad Request')
+            name = name.strip().upper().replace('-', '_')
+            value = value.strip()
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name in environ:
+                environ[name] += ',' + value
+            else:
+                environ[name] = value
+
+        if 'chunked' in environ.get('HTTP_TRANSFER_ENCODING', '').lower():
+            raise _BadRequest('411 Length Required')
+        length = environ.get('CONTENT_LENGTH') or '0'
+        if not length.isdigit():
+            # int() also takes '-20' or '+5', which would desync the body.
+            raise _BadRequest('400 Bad Request')
+        length = int(length)
+
+        connection = environ.get('HTTP_CONNECTION', '').lower()
+        if version == 'HTTP/1.1':
+            environ['flango.keep_alive'] = connection != 'close'
+        else:
+            environ['flango.keep_alive'] = connection == 'keep-alive'
+        return environ, length
+
+    def _process_next(self):
+        if self.busy or self.transport is None:
+            return
+        if not self.requests:
+            if self.eof:
+                self.transport.close()
+            return
+        if isinstance(self.requests[0], _BadRequest):
+            self._write_error(self.requests.popleft().status)
+            return
+        if len(self.requests) < self.server.max_pipeline and not self.failed:
+            self.transport.resume_reading()
+
+        self.busy = True
+        self._cancel_idle_timer()
+        environ = self.requests.popleft()
+        future = self.loop.run_in_executor(self.server.executor, self._respond, environ)
+        future.add_done_callback(self._request_done)
+
+    def _request_done(self, future):
+        self.busy = False
+        if future.cancelled() or future.exception() is not None or not future.result():
+            self._close()
+            return
+        if self.transport is not None:
+            self._start_idle_timer()
+            self._process_next()
+
+    def _send(self, data):
+        """ Write `data` from a worker thread and wait until the event
+        loop has taken it, so a slow client holds back the application.
+        """
+        self.writable.wait()
+        done = threading.Event()
+
+        def write():
+            if self.transport is not None:
+                self.transport.write(data)
+            done.set()
+
+        self.loop.call_soon_threadsafe(write)
+        done.wait()
+        if self.transport is None:
+            raise _ConnectionLost()
+
+    def _respond(self, environ):
+        """ Run the application in a worker thread, return whether the
+        connection can be kept alive.
+        """
+        response = _Response(self, environ)
+        try:
+            result = self.app(environ, response.start_response)
+        except _ConnectionLost:
+            return False
+        except Exception:
+            return response.error()
+        try:
+            if isinstance(result, (list, tuple)):
+                response.set_length(sum(len(chunk) for chunk in result))
+            if not (isinstance(result, FileWrapper) and response.sendfile(result)):
+                for chunk in result:
+                    if chunk:
+                        response.write(chunk)
+            response.finish()
+        except _ConnectionLost:
+            return False
+        except Exception:
+            return response.error()
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response.keep_alive
+
+
+class _Response(object):
+    """ Framing of one response: Content-Length when it is known, chunked
+    transfer coding for HTTP/1.1 clients, closing the connection otherwise.
+    """
+    def __init__(self, protocol, environ):
+        self.protocol = protocol
+        self.keep_alive = environ['flango.keep_alive']
+        self.http11 = environ['SERVER_PROTOCOL'] == 'HTTP/1.1'
+        self.head = environ['REQUEST_METHOD'] == 'HEAD'
+        self.status = None
+        self.headers = None
+        self.headers_sent = False
+        self.chunked = False
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info:
+            try:
+                if self.headers_sent:
+                    raise exc_info[1]
+            finally:
+                exc_info = None
+        elif self.status is not None:
+            raise AssertionError('Headers already set.')
+        self.status = status
+        self.headers = list(headers)
+        return self.write
+
+    def set_length(self, length):
+        if self.headers is not None and not self._has_header('content-length'):
+            self.headers.append(('Content-Length', str(length)))
+
+    def _has_header(self, name):
+        return any(key.lower() == name for key, _ in self.headers)
+
+    def _send_headers(self):
+        if self.status is None:
+            raise AssertionError('write() before start_response().')
+        code = int(self.status[:3])
+        bodyless = self.head or code < 200 or code in (204, 304)
+        if not self._has_header('content-length') and not bodyless:
+            if self.http11:
+                self.chunked = True
+                self.headers.append(('Transfer-Encoding', 'chunked'))
+            else:
+                self.keep_alive = False
+
+        if not self.keep_alive:
+            self.headers.append(('Connection', 'close'))
+        elif not self.http11:
+            self.headers.append(('Connection', 'keep-alive'))
+
+        lines = ['HTTP/1.1 ' + self.status]
+        lines.extend('{0}: {1}'.format(key, value) for key, value in self.headers)
+        self.protocol._send(_bytes('\r\n'.join(lines) + '\r\n\r\n'))
+        self.headers_sent = True
+
+    def write(self, data):
+        if not self.headers_sent:
+            self._send_headers()
+        if self.head:
+            return
+        if self.chunked:
+            data = _bytes('%x\r\n' % len(data)) + data + b'\r\n'
+        self.protocol._send(data)
+
+    def sendfile(self, wrapper):
+        """ Send the file of `wrapper` with `loop.sendfile` when its length
+        is known, return False to fall back to iterating over it.
+        """
+        loop = self.protocol.loop
+        if self.status is None or not hasattr(loop, 'sendfile') or not self._has_header('content-length'):
+            return False
+        self._send_headers()
+        transport = self.protocol.transport
+        if self.head or transport is None:
+            return True
+        length = int([value for key, value in self.headers if key.lower() == 'content-length'][-1])
+        offset = wrapper.filelike.tell()
+        future = asyncio.run_coroutine_threadsafe(
+            loop.sendfile(transport, wrapper.filelike, offset, length), loop)
+        future.result()
+        return True
+
+    def finish(self):
+        if not self.headers_sent:
+            self.set_length(0)
+            self._send_headers()
+        if self.chunked and not self.head:
+            self.protocol._send(b'0\r\n\r\n')
+
+    def error(self):
+        """ Answer 500 if nothing was sent yet, the connection is closed. """
+        traceback.print_exc()
+        if not self.headers_sent:
+            self.status, self.headers = '500 Internal Server Error', [('Content-Length', '0')]
+            self.keep_alive = False
+            try:
+                self._send_headers()
+            except _ConnectionLost:
+                pass
+        return False
+
+
+class AsyncioServer(ServerAdapter):
+    """ HTTP/1.1 server on an asyncio event loop with keep-alive and
+    pipelining, the WSGI application runs on a pool of `threads` threads.
+
+    - `keep_alive_timeout`: seconds before an idle connection is closed,
+    - `max_pipeline`: pipelined requests read ahead of the one in progress,
+    - `max_header_size`: maximum size in bytes of a request head.
+    """
+    def __init__(self, host='127.0.0.1', port=8000, threads=10, backlog=1024, keep_alive_timeout=75,
+                 max_pipeline=16, max_header_size=65536):
+        super(AsyncioServer, self).__init__(host, port)
+        self.threads = threads
+        self.backlog = backlog
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_pipeline = max_pipeline
+        self.max_header_size = max_header_size
+        self.loop = None
+        self.executor = None
+        # the _HTTPProtocol of the open connections
+        self.connections = set()
+
+    def run(self, app):
+        if asyncio is None:
+            raise RuntimeError('AsyncioServer requires asyncio (Python 3.4+).')
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = ThreadPoolExecutor(self.threads)
+        server = self.loop.run_until_complete(self.loop.create_server(
+            lambda: _HTTPProtocol(self, app), self.host, self.port, backlog=self.backlog))
+        try:
+            self.loop.run_forever()
+        finally:
+            server.close()
+            for connection in list(self.connections):
+                connection._close()
+            self.loop.run_until_complete(server.wait_closed())
+            self.executor.shutdown(wait=False)
+            self.loop.close()
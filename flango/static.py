@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+    flango.static
+    ~~~~~~~~~~~~~
+
+    Metadata and content of the static files served by `Flango.handle_static`.
+
+    A `StaticEntry` holds what a static response needs: the content type,
+    the prebuilt Last-Modified string, the ETag, and the bytes of the file
+    when it is small enough to be kept in memory.
+
+    `StaticCache` keeps the entries of the recently served files, so the
+    hot files are served without any filesystem syscall:
+
+            app = Flango('blog', static_cache=StaticCache(max_size=32 * 1024 * 1024))
+
+    A cached entry is checked against `os.stat` at most once every
+    `check_interval` seconds, the bytes kept in memory never exceed
+    `max_size` and the least recently used entries are evicted first.
+
+    The helpers at the end of the module implement the conditional
+    (`If-None-Match`, `If-Modified-Since`) and the range requests, and
+    `AssetManifest` the fingerprinted URLs of `url_for('static', ...)`.
+"""
+import os
+import re
+import time
+import stat
+import hashlib
+import threading
+import mimetypes
+import collections
+from email.utils import parsedate
+
+
+# fallback of the files which type can not be guessed.
+DEFAULT_CONTENT_TYPE = 'text/plain'
+
+
+class StaticEntry(object):
+    """ A static file at the time of its last `os.stat`. """
+    def __init__(self, abspath, st, data=None):
+        self.abspath = abspath
+        self.size = len(data) if data is not None else st.st_size
+        self.mtime = st.st_mtime
+        self.modified = time.gmtime(st.st_mtime)
+        self.last_modified = time.strftime('%a, %d %b %Y %H:%M:%S UTC', self.modified)
+        self.content_type = mimetypes.guess_type(abspath)[0] or DEFAULT_CONTENT_TYPE
+        # the content, None when the file is streamed from the disk.
+        self.data = data
+        # Content-Encoding of the content, set on the gzipped entries.
+        self.encoding = None
+        # the content hash when it is in memory, mtime and size otherwise.
+        if data is not None:
+            self.etag = make_etag(hashlib.sha1(data).hexdigest()[:20])
+        else:
+            self.etag = make_etag('{0:x}-{1:x}'.format(int(st.st_mtime * 1000000), st.st_size))
+        # time of the last `os.stat`
+        self.checked = time.time()
+
+    def same_file(self, st):
+        return self.mtime == st.st_mtime and self.size == st.st_size
+
+    def open(self):
+        return open(self.abspath, 'rb')
+
+    def read(self, start, length):
+        """ `length` bytes from `start`, only this slice is read from the disk. """
+        if self.data is not None:
+            return self.data[start:start + length]
+        with self.open() as f:
+            f.seek(start)
+            return f.read(length)
+
+
+def stat_file(abspath):
+    """ The os.stat result of a regular file, None if there is no such file. """
+    try:
+        st = os.stat(abspath)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+def load_entry(abspath):
+    """ An uncached entry of the file, None if there is no such file. """
+    st = stat_file(abspath)
+    return StaticEntry(abspath, st) if st is not None else None
+
+
+class StaticCache(object):
+    """ LRU cache of `StaticEntry` keyed by absolute path.
+
+    Files up to `max_file_size` bytes are kept in memory, the larger ones
+    only keep their metadata and are streamed from the disk.
+    """
+    def __init__(self, max_size=64 * 1024 * 1024, max_file_size=256 * 1024, check_interval=1.0):
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.check_interval = check_interval
+        # bytes of the cached contents
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, abspath):
+        """ The entry of the file, None if there is no such file. """
+        with self._lock:
+            entry = self._entries.pop(abspath, None)
+            if entry is not None:
+                self._entries[abspath] = entry
+        now = time.time()
+        if entry is not None and now - entry.checked < self.check_interval:
+            return entry
+
+        st = stat_file(abspath)
+        if st is None:
+            self.remove(abspath)
+            return None
+        if entry is not None and entry.same_file(st):
+            entry.checked = now
+            return entry
+
+        data = None
+        if st.st_size <= self.max_file_size:
+            with open(abspath, 'rb') as f:
+                data = f.read()
+        entry = StaticEntry(abspath, st, data)
+        self._set(abspath, entry)
+        return entry
+
+    def _set(self, abspath, entry):
+        with self._lock:
+            self._remove(abspath)
+            self._entries[abspath] = entry
+            if entry.data is not None:
+                self.size += len(entry.data)
+            while self.size > self.max_size and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, abspath):
+        entry = self._entries.pop(abspath, None)
+        if entry is not None and entry.data is not None:
+            self.size -= len(entry.data)
+
+    def remove(self, abspath):
+        with self._lock:
+            self._remove(abspath)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, abspath):
+        return abspath in self._entries
+
+
+def make_etag(value, weak=False):
+    return '{0}"{1}"'.format('W/' if weak else '', value)
+
+
+def etag_matches(header, etag, weak=True):
+    """ Does `etag` match the If-None-Match / If-Range `header`?
+
+    The weak comparison of If-None-Match ignores the `W/` prefixes, the
+    strong comparison of If-Range never matches a weak ETag.
+    """
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if weak:
+            if tag.replace('W/', '', 1) == etag.replace('W/', '', 1):
+                return True
+        elif tag == etag and not etag.startswith('W/'):
+            return True
+    return False
+
+
+def modified_since(header, entry):
+    """ Has `entry` been modified since the If-Modified-Since `header`?
+
+    Clients send back the Last-Modified string most of the time, the date
+    is only parsed when it differs.
+    """
+    if header == entry.last_modified:
+        return False
+    since = parsedate(header)
+    if since is None:
+        return True
+    return tuple(entry.modified)[:6] > tuple(since)[:6]
+
+
+# the requests with more ranges are answered with the whole file.
+MAX_RANGES = 16
+
+_range_re = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def parse_range(header, size):
+    """ The satisfiable ranges of the Range `header` as `(start, length)`
+    pairs, [] if none of them is satisfiable and None if the header is
+    invalid, too long or not in bytes. The overlapping and adjacent
+    ranges are merged, so no byte of the file is sent twice.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    specs = specs.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = _range_re.match(spec)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            # suffix range, the last bytes of the file.
+            if not int(last):
+                continue
+            start = max(size - int(last), 0)
+            end = size - 1
+        else:
+            return None
+        ranges.append((start, end - start + 1))
+    return merge_ranges(ranges)
+
+
+def merge_ranges(ranges):
+    """ `ranges` sorted by start, the overlapping and adjacent ones joined. """
+    merged = []
+    for start, length in sorted(ranges):
+        if merged and start <= merged[-1][0] + merged[-1][1]:
+            first, size = merged[-1]
+            merged[-1] = (first, max(size, start + length - first))
+        else:
+            merged.append((start, length))
+    return merged
+
+
+def content_range(start, length, size):
+    return 'bytes {0}-{1}/{2}'.format(start, start + length - 1, size)
+
+
+class FileRange(object):
+    """ File-like object reading `length` bytes from `start` of `fileobj`.
+
+    The file is positioned at `start`, so servers sending `fileno` with
+    `os.sendfile` from the current offset send the range only.
+    """
+    def __init__(self, fileobj, start, length):
+        self._file = fileobj
+        self.remain = length
+        fileobj.seek(start)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remain:
+            size = self.remain
+        data = self._file.read(size)
+        self.remain -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+class MultipartRanges(object):
+    """ `multipart/byteranges` body of the `ranges` of `entry`, streamed:
+    each range is read `block_size` bytes at a time and `length`, the
+    Content-Length, is known before anything is read.
+    """
+    def __init__(self, entry, ranges, boundary, block_size):
+        self.entry = entry
+        self.block_size = block_size
+        self.parts = []
+        for start, length in ranges:
+            head = '--{0}\r\nContent-Type: {1}\r\nContent-Range: {2}\r\n\r\n'.format(
+                boundary, entry.content_type, content_range(start, length, entry.size))
+            self.parts.append((head.encode('latin-1'), start, length))
+        self.end = '--{0}--\r\n'.format(boundary).encode('latin-1')
+        self.length = len(self.end) + sum(len(head) + length + 2 for head, _, length in self.parts)
+
+    def __iter__(self):
+        if self.entry.data is not None:
+            for head, start, length in self.parts:
+                yield head
+                yield self.entry.read(start, length)
+                yield b'\r\n'
+            yield self.end
+            return
+        with self.entry.open() as f:
+            for head, start, length in self.parts:
+                yield head
+                f.seek(start)
+                while length > 0:
+                    data = f.read(min(self.block_size, length))
+                    if not data:
+                        break
+                    length -= len(data)
+                    yield data
+                yield b'\r\n'
+        yield self.end
+
+
+class _Asset(object):
+    def __init__(self, st, fingerprinted):
+        self.mtime = st.st_mtime
+        self.size = st.st_size
+        self.fingerprinted = fingerprinted
+        self.checked = time.time()
+
+
+class AssetManifest(object):
+    """ Content hashed names of the files of the static `directory`:
+    `app.js` is served as `app.3f2a9c1d.js`, which never changes, so
+    browsers may cache it forever. The names are computed by `build`
+    or on the first use of each file, then again when the file changes
+    (checked at most once every `check_interval` seconds).
+    """
+    def __init__(self, directory, length=8, check_interval=1.0):
+        self.directory = directory
+        self.length = length
+        self.check_interval = check_interval
+        # filename: _Asset
+        self._assets = {}
+        # fingerprinted filename: filename
+        self._filenames = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        """ Fingerprint all the files of the directory. """
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                relpath = os.path.relpath(os.path.join(root, name), self.directory)
+                self.get(relpath.replace(os.sep, '/'))
+
+    def fingerprint(self, filename, data):
+        digest = hashlib.sha1(data).hexdigest()[:self.length]
+        stem, ext = os.path.splitext(filename)
+        return '{0}.{1}{2}'.format(stem, digest, ext)
+
+    def get(self, filename):
+        """ The fingerprinted name of `filename`, None if there is no such file. """
+        asset = self._assets.get(filename)
+        now = time.time()
+        if asset is not None and now - asset.checked < self.check_interval:
+            return asset.fingerprinted
+
+        abspath = os.path.join(self.directory, filename)
+        st = stat_file(abspath)
+        if st is None:
+            with self._lock:
+                self._remove(filename)
+            return None
+        if asset is not None and asset.mtime == st.st_mtime and asset.size == st.st_size:
+            asset.checked = now
+            return asset.fingerprinted
+
+        with open(abspath, 'rb') as f:
+            asset = _Asset(st, self.fingerprint(filename, f.read()))
+        with self._lock:
+            self._remove(filename)
+            self._assets[filename] = asset
+            self._filenames[asset.fingerprinted] = filename
+        return asset.fingerprinted
+
+    def resolve(self, fingerprinted):
+        """ The filename of a current fingerprinted name, None otherwise.
+        Names not seen yet, like the URLs of the pages rendered before a
+        restart, are parsed back to `stem.ext` and checked against it.
+        """
+        filename = self._filenames.get(fingerprinted)
+        if filename is None:
+            stem, ext = os.path.splitext(fingerprinted)
+            stem, dot, digest = stem.rpartition('.')
+            if not dot or len(digest) != self.length:
+                return None
+            filename = stem + ext
+        if self.get(filename) == fingerprinted:
+            return filename
+        return None
+
+    def _remove(self, filename):
+        asset = self._assets.pop(filename, None)
+        if asset is not None:
+            self._filenames.pop(asset.fingerprinted, None)
@@ -66,6 +66,19 @@
             >>> template.Template('{{ list(map(lambda x: x * 2, [1, 2, 3])) }}').render()
             '[2, 4, 6]'
 
+    variables are escaped with `autoescape`, except `Markup` and the
+    ones marked safe::
+
+            >>> template.Template('{{ a }} {{ b|safe }}', autoescape=True).render(a='<br>', b='<br>')
+            &lt;br&gt; <br>
+
+    the output of an expensive part is kept for `ttl` seconds, by the
+    value of its key::
+
+            {% cache ('sidebar', user.id), 60 %}
+                {{ tag_cloud() }}
+            {% endcache %}
+
     and lastly, inheritance of template, extends and include::
 
             {% extends 'base.html' %}
@@ -76,49 +89,104 @@
 """
 import re
 import os
+import copy
+import time
+import marshal
+import hashlib
+import symtable
+import threading
 import collections
 
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+try:
+    from importlib.util import MAGIC_NUMBER as _PYTHON_MAGIC
+except ImportError:  # Python 2
+    from imp import get_magic
+    _PYTHON_MAGIC = get_magic()
+
 
 # LRU Cache capacity:
 _CACHE_CAPACITY = 128
 
+# pieces of output in a streamed chunk.
+_BUFFER_SIZE = 64
+
 
 class Scanner(object):
     """ Scanner is a inner class of Template which provide
     custom template source reading operations.
+
+    The source is searched from the position of the previous token, it
+    is never copied, and the line and column of each token are counted
+    on the way.
     """
     def __init__(self, source):
         # pattern for variable, function, block, statement.
+        # `{%-` and `-%}` strip the whitespace before and after the tag.
         self.pattern = re.compile(r'''
             {{\s*(?P<var>.+?)\s*}}  # variable: {{ name }} or function like: {{ abs(-2) }}
             |  # or
-            {%\s*(?P<endtag>end(if|for|while|block))\s*%}  # endtag: {% endfor %}
-            |  # or
-            {%\s*(?P<statement>(?P<keyword>\w+)\s*(.+?))\s*%}  # statement: {% for i in range(10) %}
+            {%(?P<lstrip>-?)\s*(?:
+                (?P<endtag>end(?P<tag>if|for|while|block|cache))  # endtag: {% endfor %}
+                |  # or
+                (?P<statement>(?P<keyword>\w+)\s*(?P<suffix>.*?))  # statement: {% for i in range(10) %}
+            )\s*(?P<rstrip>-?)%}
             ''', re.VERBOSE)
+        self.source = source
+        # position of the text which have not been processed.
+        self.pos = 0
         # the pre-text before token.
         self.pretext = ''
-        # the remaining text which have not been processed.
-        self.remain = source
+        # line and column of the last token, from 1.
+        self.lineno = 1
+        self.column = 1
+        self._line_start = 0
+        self._counted = 0
 
     def next_token(self):
         """ Get the next token which match the pattern semantic.
         return `None` if there is no more tokens, otherwise,
         return matched regular expression group of token `t`, get
-        the pre-text and the remain text at the same time.
+        the pre-text and the location of the token at the same time.
         """
-        t = self.pattern.search(self.remain)
+        t = self.pattern.search(self.source, self.pos)
         if not t:
             return None
 
-        self.pretext = self.remain[:t.start()]
-        self.remain = self.remain[t.end():]
+        self.pretext = self.source[self.pos:t.start()]
+        self._locate(t.start())
+        self.pos = t.end()
         return t
 
+    def _locate(self, pos):
+        newlines = self.source.count('\n', self._counted, pos)
+        if newlines:
+            self.lineno += newlines
+            self._line_start = self.source.rfind('\n', self._counted, pos) + 1
+        self._counted = pos
+        self.column = pos - self._line_start + 1
+
+    @property
+    def indentation(self):
+        """ Whitespace from the start of the line to the last token, None
+        if something else is before it on its line.
+        """
+        prefix = self.source[self._line_start:self._line_start + self.column - 1]
+        return None if prefix.strip(' \t') else prefix
+
+    @property
+    def remain(self):
+        """ the remaining text which have not been processed. """
+        return self.source[self.pos:]
+
     @property
     def empty(self):
         """ Return `True` if the source have been processed."""
-        return self.remain == ''
+        return self.pos >= len(self.source)
 
 
 class BaseNode(object):
@@ -127,37 +195,98 @@ class BaseNode(object):
     Subclass of BaseNode must implement 'generate' interface for
     output Python intermediate code generating.
     """
-    def __init__(self, text, indent, block):
+    def __init__(self, text, indent, block, location=None):
         self.text = text
         self.indent = indent
         self.block = block
+        # `name:line:column` of the tag, written as a comment after the
+        # code of the node so compile errors are reported there.
+        self.location = location
 
     def generate(self):
         raise NotImplementedError()
 
+    def comment(self):
+        return '  # {0}'.format(self.location) if self.location else ''
+
+
+# the intermediate code of the nodes is the body of the `_render` generator,
+# the names it uses are bound to locals at its entry, see `Template._compile`.
+_RENDER_FUNCTION = '''def _render(_ctx, _namespace, _stdout, _buffer_size):
+ _append = _stdout.append
+ _len = _builtins['len']
+{0}{1} yield
+'''
+
+# yield the buffered output to `Template.stream` when it's big enough.
+_FLUSH = '{0}if _len(_stdout) >= _buffer_size: yield\n'
+
+# local `name` from the context, the namespace or the builtins, left
+# unbound otherwise so using it raises a NameError.
+_BINDING = ''' if {0!r} in _ctx: {0} = _ctx[{0!r}]
+ elif {0!r} in _namespace: {0} = _namespace[{0!r}]
+'''
+_BUILTIN_BINDING = ''' else: {0} = _builtins[{0!r}]
+'''
+
+# globals of the compiled code, never taken from the context.
+_GLOBALS = ('escape', '_builtins', '_fragments', '_fragment_key', '_store_fragment')
+
+# locals of the generated code, not the ones of the template.
+_GENERATED = re.compile(r'^_(append|len|(key|ttl|text|fragment|outer)[0-9a-f]+)$')
+
 
 class TextNode(BaseNode):
     """ Node for normal text. """
     def generate(self):
-        return '{0}_stdout.append(\'\'\'{1}\'\'\')\n'.format(' '*self.indent, self.text)
+        indent = ' ' * (self.indent + 1)
+        return '{0}_append({1!r})\n'.format(indent, self.text) + _FLUSH.format(indent)
 
 
 class VariableNode(BaseNode):
     """ Node for variables: such as {{ name }}. """
     def generate(self):
-        return '{0}_stdout.append({1})\n'.format(' '*self.indent, self.text)
+        indent = ' ' * (self.indent + 1)
+        return '{0}_append({1}){2}\n'.format(indent, self.text, self.comment()) + _FLUSH.format(indent)
 
 
 class KeyNode(BaseNode):
     """ Node for keywords like if else... """
     def generate(self):
-        return '{0}{1}\n'.format(' '*self.indent, self.text)
+        code = '{0}{1}{2}\n'.format(' '*(self.indent + 1), self.text, self.comment())
+        if self.text.endswith(':'):
+            # the body may be empty once its whitespace is trimmed.
+            code += '{0}pass\n'.format(' '*(self.indent + 2))
+        return code
 
 
 class TemplateException(Exception):
     pass
 
 
+class TemplateSyntaxError(TemplateException):
+    """ Syntax error at `lineno` and `column` of the template `name`. """
+    def __init__(self, message, name, lineno=None, column=None):
+        self.name = name
+        self.lineno = lineno
+        self.column = column
+        if lineno is not None:
+            message = '{0} ({1}, line {2}, column {3})'.format(message, name, lineno, column)
+        else:
+            message = '{0} ({1})'.format(message, name)
+        super(TemplateSyntaxError, self).__init__(message)
+
+
+# block of the generated code, between its `block%name` and `endblock%name` markers.
+_BLOCK = re.compile(r'[ ]*block%(?P<start_block>\w+)(?P<block_code>.*?)endblock%(?P<end_block>\w+)', re.S)
+
+# marker of the variables which are not escaped.
+_SAFE = re.compile(r'\s*\|\s*safe$')
+
+# location comment of the generated code, see `BaseNode.location`.
+_LOCATION = re.compile(r'# (.*):(\d+):(\d+)$')
+
+
 class Template(object):
     """ Main class for compiled template instance.
 
@@ -174,70 +303,167 @@ class Template(object):
     `exec` also has a huge problem in security, so be careful
     and be serious, and I am very serious too.
     """
-    def __init__(self, source, path='', autoescape=False):
+    def __init__(self, source, path='', autoescape=False, buffer_size=_BUFFER_SIZE, name='<string>',
+                 code=None, dependencies=(), stamps=(), loader=None, fragment_cache=None):
         if not source:
             raise ValueError('Invalid parameter')
 
-        self.scanner = Scanner(source)
+        # `\r\n` line endings are rendered as `\n`.
+        self.scanner = Scanner(source.replace('\r\n', '\n'))
         # path for extends and include
         self.path = path
-        self.nodes = []
+        # file name in the error messages
+        self.name = name
+        self._nodes = None
         # parent template
         self.parent = None
         self.autoescape = autoescape
+        # pieces of output in a chunk of `stream`.
+        self.buffer_size = buffer_size
+        # files of the extended and included templates.
+        self.dependencies = list(dependencies)
+        # `(path, (mtime, size))` of these files when they were parsed.
+        self.stamps = list(stamps)
+        # `Loader` of the extended and included templates, they are
+        # shared by all the templates loaded by it.
+        self.loader = loader
+        # generated code split at the blocks, see `_segments`.
+        self._block_segments = None
+        # backend of the `{% cache %}` fragments, the one of `loader` by default.
+        self.fragment_cache = fragment_cache
+
+        # compiled intermediate code, given by `BytecodeCache`
+        # when the template is not changed since it was compiled.
+        if code is None:
+            code = self._compile()
+        self.intermediate = code
+        # `_render` function and its names, see `_function`.
+        self._render = None
 
-        self._parse()
-        # compiled intermediate code.
-        self.intermediate = self._compile()
+    @property
+    def nodes(self):
+        """ Nodes of the template, parsed on first use when the code
+        comes from the bytecode cache.
+        """
+        if self._nodes is None:
+            self._nodes = []
+            self._parse()
+        return self._nodes
 
     def _parse(self):
         python_keywords = ['if', 'for', 'while', 'try', 'else', 'elif', 'except', 'finally']
         indent = 0
         block_stack = []
+        # ids of the open `{% cache %}` tags.
+        cache_stack = []
 
         def block_stack_top():
             return block_stack[-1] if block_stack else None
 
+        def location():
+            return '{0}:{1}:{2}'.format(self.name, self.scanner.lineno, self.scanner.column)
+
+        def syntax_error(message):
+            return TemplateSyntaxError(message, self.name, self.scanner.lineno, self.scanner.column)
+
+        def add_text(text):
+            # whitespace after the previous tag, see `strip`.
+            if strip == '-':
+                text = text.lstrip()
+            elif strip and text.startswith('\n'):
+                text = text[1:]
+            if text:
+                self.nodes.append(TextNode(text, indent, block_stack_top()))
+
+        # how the text after the previous tag is trimmed: '-' for all
+        # its leading whitespace, True for its first newline.
+        strip = None
         while not self.scanner.empty:
             token = self.scanner.next_token()
             if not token:
-                self.nodes.append(TextNode(self.scanner.remain, indent, block_stack_top()))
+                add_text(self.scanner.remain)
                 break
             # get the pre-text before token.
-            if self.scanner.pretext:
-                self.nodes.append(TextNode(self.scanner.pretext, indent, block_stack_top()))
+            pretext = self.scanner.pretext
+            variable, endtag, tag, statement, keyword, suffix = token.group(
+                'var', 'endtag', 'tag', 'statement', 'keyword', 'suffix')
+            if not variable:
+                # the whitespace before a tag is not rendered, nor the
+                # newline after it, so a tag on its own line leaves no
+                # blank line.
+                if token.group('lstrip'):
+                    pretext = pretext.rstrip()
+                elif self.scanner.indentation is not None:
+                    pretext = pretext[:len(pretext) - len(self.scanner.indentation)]
+            add_text(pretext)
+            strip = None if variable else token.group('rstrip') or True
 
-            variable, endtag, tag, statement, keyword, suffix = token.groups()
             if variable:
-                node_text = 'escape(str({0}))'.format(variable) if self.autoescape else variable
-                self.nodes.append(VariableNode(node_text, indent, block_stack_top()))
+                # `{{ value|safe }}` is not escaped.
+                safe = _SAFE.search(variable)
+                if safe:
+                    variable = variable[:safe.start()]
+                node_text = 'escape({0})'.format(variable) if self.autoescape and not safe else variable
+                self.nodes.append(VariableNode(node_text, indent, block_stack_top(), location()))
             elif endtag:
+                if tag == 'cache':
+                    if not cache_stack:
+                        raise syntax_error('Unexpected endcache.')
+                    n = cache_stack.pop()
+                    self.nodes.append(KeyNode('_text{0} = _store_fragment(_fragments, _key{0}, _fragment{0}, _ttl{0}); '
+                                              '_append = _outer{0}'.format(n), indent, block_stack_top()))
+                    indent -= 1
+                    self.nodes.append(VariableNode('_text{0}'.format(n), indent, block_stack_top()))
+                    continue
                 if tag != 'block':
+                    if indent == 0:
+                        raise syntax_error('Unexpected {0}.'.format(endtag))
                     indent -= 1
                     continue
+                if not block_stack:
+                    raise syntax_error('Unexpected endblock.')
                 # block placeholder in parent template nodes
                 if not self.parent:
                     node_text = 'endblock%{0}'.format(block_stack_top())
                     self.nodes.append(KeyNode(node_text, indent, block_stack_top()))
                 block_stack.pop()
             elif statement:
+                suffix = suffix.strip()
                 if keyword == 'include':
                     filename = re.sub(r'\'|\"', '', suffix)
-                    nodes = Loader(self.path).load(filename).nodes
-                    for node in nodes:
+                    # copies, the nodes of the included template are shared.
+                    for node in self._load(filename).nodes:
+                        node = copy.copy(node)
                         node.indent += indent
-                    self.nodes.extend(nodes)
+                        node.block = node.block or block_stack_top()
+                        self.nodes.append(node)
                 elif keyword == 'extends':
                     if self.nodes:
-                        raise TemplateException('Template syntax error: extends tag must be '
-                                                'at the beginning of the file.')
+                        raise syntax_error('Template syntax error: extends tag must be '
+                                           'at the beginning of the file.')
                     filename = re.sub(r'\'|\"', '', suffix)
-                    self.parent = Loader(self.path).load(filename)
+                    self.parent = self._load(filename)
                 elif keyword == 'block':
                     block_stack.append(suffix)
                     if not self.parent:
                         node_text = 'block%{0}'.format(suffix)
                         self.nodes.append(KeyNode(node_text, indent, block_stack_top()))
+                elif keyword == 'cache':
+                    # `{% cache key, ttl %}`: the output of the body is kept
+                    # in `_fragments`, the body does not run while it's there.
+                    if not suffix:
+                        raise syntax_error('Missing key of cache.')
+                    # named after the location of the tag, the variables of the
+                    # `{% cache %}` tags of included templates never clash.
+                    n = hashlib.sha1(location().encode('utf-8')).hexdigest()[:12]
+                    cache_stack.append(n)
+                    self.nodes.append(KeyNode('_key{0}, _ttl{0} = _fragment_key({1!r}, {2})'.format(
+                        n, location(), suffix), indent, block_stack_top(), location()))
+                    self.nodes.append(KeyNode('_text{0} = _fragments.get(_key{0})'.format(n), indent, block_stack_top()))
+                    self.nodes.append(KeyNode('if _text{0} is None:'.format(n), indent, block_stack_top()))
+                    indent += 1
+                    self.nodes.append(KeyNode('_outer{0} = _append; _fragment{0} = []; '
+                                              '_append = _fragment{0}.append'.format(n), indent, block_stack_top()))
                 elif keyword in python_keywords:
                     node_text = '{0}:'.format(statement)
                     if keyword in ['else', 'elif', 'except', 'finally']:
@@ -246,41 +472,171 @@ class Template(object):
                         key_indent = indent
                         indent += 1
 
-                    self.nodes.append(KeyNode(node_text, key_indent, block_stack_top()))
+                    self.nodes.append(KeyNode(node_text, key_indent, block_stack_top(), location()))
                 else:
-                    raise TemplateException('Invalid keyword: {0}.'.format(keyword))
+                    raise syntax_error('Invalid keyword: {0}.'.format(keyword))
             else:
-                raise TemplateException('Template syntax error.')
+                raise syntax_error('Template syntax error.')
+        self._nodes = _merge_text(self._nodes)
+
+    def _load(self, filename):
+        """ Load an extended or included template, which is a dependency. """
+        loader = self.loader if self.loader is not None else Loader(self.path)
+        entry = loader._entry(filename)
+        template = entry.template
+        self.dependencies.append(os.path.join(self.path, filename))
+        self.dependencies.extend(template.dependencies)
+        self.stamps.extend(entry.stamps)
+        return template
+
+    def _segments(self):
+        """ The generated code split at the blocks: strings of code and
+        `(name, code)` pairs of the blocks. It is generated once, then
+        reused by all the templates extending this one.
+        """
+        if self._block_segments is None:
+            generate_code = ''.join(node.generate() for node in self.nodes)
+            segments = []
+            pos = 0
+            for token in _BLOCK.finditer(generate_code):
+                block_name = token.group('start_block')
+                if block_name != token.group('end_block'):
+                    raise TemplateSyntaxError('Unclosed block {0}.'.format(block_name), self.name)
+                segments.append(generate_code[pos:token.start()])
+                segments.append((block_name, token.group('block_code')))
+                pos = token.end()
+            segments.append(generate_code[pos:])
+            self._block_segments = segments
+        return self._block_segments
 
     def _compile(self):
         block = {}
+        nodes = self.nodes
 
         if self.parent:
-            generate_code = ''.join(node.generate() for node in self.parent.nodes)
-            pattern = re.compile(r'block%(?P<start_block>\w+)(?P<block_code>.*?)endblock%(?P<end_block>\w+)', re.S)
-            for node in self.nodes:
+            for node in nodes:
                 block.setdefault(node.block, []).append(node.generate())
+            segments = self.parent._segments()
+        else:
+            segments = self._segments()
 
-            for token in pattern.finditer(generate_code):
-                block_name = token.group('start_block')
-                if block_name != token.group('end_block'):
-                    raise TemplateException('Template syntax error.')
+        code = []
+        for segment in segments:
+            if isinstance(segment, tuple):
+                block_name, block_code = segment
+                segment = ''.join(block[block_name]) if block_name in block else block_code
+            code.append(segment)
+        generate_code = ''.join(code)
 
-                block_code = ''.join(block[block_name]) if block_name in block.keys() else token.group('block_code')
-                generate_code = generate_code.replace(token.group(), block_code)
-        else:
-            generate_code = ''.join(node.generate() for node in self.nodes)
+        try:
+            names = _free_names(_RENDER_FUNCTION.format('', generate_code), self.name)
+            bindings = []
+            for name in names:
+                bindings.append(_BINDING.format(name))
+                if hasattr(builtins, name):
+                    bindings.append(_BUILTIN_BINDING.format(name))
+            source = _RENDER_FUNCTION.format(''.join(bindings), generate_code)
+            return compile('_names = {0!r}\n{1}'.format(names, source), self.name, 'exec')
+        except SyntaxError as e:
+            match = _LOCATION.search((e.text or '').rstrip())
+            if match is None:
+                raise TemplateSyntaxError(e.msg, self.name)
+            name, lineno, column = match.groups()
+            raise TemplateSyntaxError(e.msg, name, int(lineno), int(column))
+
+    def _function(self):
+        """ The `_render` generator function and the names it binds,
+        the compiled code is executed once.
+        """
+        if self._render is None:
+            fragments = self.fragment_cache
+            if fragments is None:
+                fragments = getattr(self.loader, 'fragment_cache', None)
+            if fragments is None:
+                fragments = FragmentCache()
+            namespace = {'escape': escape, '_builtins': builtins.__dict__, '_fragments': fragments,
+                         '_fragment_key': _fragment_key, '_store_fragment': _store_fragment}
+            exec(self.intermediate, namespace)
+            self._render = namespace['_render'], frozenset(namespace['_names'])
+        return self._render
 
-        return compile(generate_code, '<string>', 'exec')
+    @property
+    def names(self):
+        """ Names the template takes from its context or namespace, found
+        by the static analysis of the generated code.
+        """
+        return self._function()[1]
 
     def render(self, **context):
-        # `context['_stdout']`: Compiled template source code
-        # which is a Python list, contain all the output
-        # statement of Python code.
-        context.update({'_stdout': [], 'escape': escape})
+        return ''.join(self.stream(**context))
+
+    def render_context(self, context, namespace=None):
+        return ''.join(self.stream_context(context, namespace))
+
+    def stream(self, **context):
+        """ Render the template as a generator of text chunks, a chunk is
+        yielded as soon as `buffer_size` pieces of output are buffered, so
+        a big page is sent while it is still being rendered:
+
+            @app.route('/posts')
+            def posts():
+                return app.stream('posts.html', posts=Post.select())
+        """
+        return self.stream_context(context)
+
+    def stream_context(self, context, namespace=None):
+        """ `stream` in `context` laid over the base `namespace`.
 
-        exec(self.intermediate, context)
-        return re.sub(r'(\s+\n)+', r'\n', ''.join(map(str, context['_stdout'])))
+        Each name used by the template is bound once to a local of the
+        compiled function, from `context`, `namespace` or the builtins
+        in this order, so neither is copied and a big namespace costs
+        nothing per render.
+        """
+        render = self._function()[0]
+        stdout = []
+        for _ in render(context, namespace or {}, stdout, self.buffer_size):
+            if stdout:
+                text = ''.join(map(str, stdout))
+                del stdout[:]
+                yield text
+
+
+def _merge_text(nodes):
+    """ `nodes` with the adjacent texts of a same block merged in one
+    node, a loop appends its whole text at once.
+    """
+    merged = []
+    for node in nodes:
+        previous = merged[-1] if merged else None
+        if (isinstance(node, TextNode) and isinstance(previous, TextNode)
+                and (node.indent, node.block) == (previous.indent, previous.block)):
+            merged[-1] = TextNode(previous.text + node.text, node.indent, node.block)
+        else:
+            merged.append(node)
+    return merged
+
+
+def _free_names(source, name):
+    """ Names of `source` which `_render` and its nested scopes read, sorted
+    so the generated code is stable. The names `_render` assigns are read
+    from the context too until they are assigned, like `{{ item }}` before
+    `{% for item in items %}`.
+    """
+    names = set()
+    render = symtable.symtable(source, name, 'exec').get_children()[0]
+    for symbol in render.get_symbols():
+        if (symbol.is_assigned() and symbol.is_referenced() and not symbol.is_parameter()
+                and not _GENERATED.match(symbol.get_name())):
+            names.add(symbol.get_name())
+    tables = [render]
+    while tables:
+        table = tables.pop()
+        tables.extend(table.get_children())
+        for symbol in table.get_symbols():
+            if symbol.is_global() and symbol.is_referenced():
+                names.add(symbol.get_name())
+    # constants, they are names for the symtable of Python 2.
+    return tuple(sorted(names.difference(_GLOBALS, ('None', 'True', 'False'))))
 
 
 class LRUCache(object):
@@ -311,6 +667,60 @@ class LRUCache(object):
         self.cache[key] = value
 
 
+class FragmentCache(object):
+    """ In-process LRU cache of the fragments of `{% cache key, ttl %}`,
+    a fragment expires `ttl` seconds after it was rendered, or never when
+    `ttl` is None.
+
+    Any object with the same `get` and `set` methods can be given to
+    `Template` or `Loader` instead, to share the fragments between
+    processes for example.
+    """
+    def __init__(self, capacity=_CACHE_CAPACITY):
+        self.capacity = capacity
+        # key: (expiry time or None, text)
+        self._fragments = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ The text of the fragment, None if it's missing or expired. """
+        with self._lock:
+            fragment = self._fragments.pop(key, None)
+            if fragment is None:
+                return None
+            expires, text = fragment
+            if expires is not None and expires <= time.time():
+                return None
+            self._fragments[key] = fragment
+            return text
+
+    def set(self, key, text, ttl=None):
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._fragments.pop(key, None)
+            self._fragments[key] = (expires, text)
+            while len(self._fragments) > self.capacity:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+def _fragment_key(location, key, ttl=None):
+    """ Cache key and ttl of the `{% cache key, ttl %}` tag at `location`. """
+    return (location, key), ttl
+
+
+def _store_fragment(fragments, key, pieces, ttl):
+    text = ''.join(map(str, pieces))
+    fragments.set(key, text, ttl)
+    return text
+
+
 class Loader(object):
     """ A template Loader which loads the environments of
     main application, or just give the template system a root
@@ -321,32 +731,198 @@ class Loader(object):
 
     Loader class use a LRU cache system to cache the recently used
     templates for performance consideration.
+
+    With `auto_reload`, a cached template is checked at most once every
+    `check_interval` seconds: it is compiled again when the mtime or the
+    size of its file, or of a template it extends or includes, changed.
     """
-    def __init__(self, path='', engine=Template, cache_capacity=_CACHE_CAPACITY):
+    def __init__(self, path='', engine=Template, cache_capacity=_CACHE_CAPACITY, bytecode_cache=None,
+                 auto_reload=False, check_interval=1.0, fragment_cache=None):
         self.path = path
         self.engine = engine
         self.cache = LRUCache(capacity=cache_capacity)
+        # `BytecodeCache` sharing the compiled templates between processes.
+        self.bytecode_cache = bytecode_cache
+        self.auto_reload = auto_reload
+        self.check_interval = check_interval
+        # backend of the `{% cache %}` fragments of the templates, each
+        # template has its own `FragmentCache` without it.
+        self.fragment_cache = fragment_cache
+        self._lock = threading.Lock()
 
     def load(self, filename):
+        return self._entry(filename).template
+
+    def _entry(self, filename):
+        """ The `_CacheEntry` of `filename`, loaded again when it changed. """
         if not self.path.endswith(os.sep) and self.path != '':
             self.path = self.path + os.sep
 
         p = ''.join([self.path, filename])
 
-        cache_instance = self.cache.get(p)
-        if cache_instance != -1:
-            return cache_instance
+        with self._lock:
+            entry = self.cache.get(p)
+        if entry != -1 and (not self.auto_reload or self._is_fresh(entry)):
+            return entry
 
         if not os.path.isfile(p):
             raise TemplateException('Template file {0} is not exist.'.format(p))
 
+        # stamped before it is read, a change made meanwhile is seen by the next check.
+        stamp = _stamps([p])
         with open(p) as f:
-            self.cache.set(p, self.engine(f.read(), path=self.path))
+            template = self._create(p, filename, f.read())
+        # the dependencies are stamped as they were parsed, a child compiled
+        # with a stale parent is compiled again once the parent is.
+        entry = _CacheEntry(template, stamp + template.stamps)
+        with self._lock:
+            self.cache.set(p, entry)
+
+        return entry
+
+    def _is_fresh(self, entry):
+        now = time.time()
+        if now - entry.checked < self.check_interval:
+            return True
+        if _stamps(path for path, _ in entry.stamps) != entry.stamps:
+            return False
+        entry.checked = now
+        return True
+
+    def _create(self, p, filename, source):
+        if self.bytecode_cache is None:
+            return self.engine(source, path=self.path, name=filename, loader=self)
+
+        checksum = self.bytecode_cache.checksum(p, source)
+        cached = self.bytecode_cache.load(p, checksum)
+        if cached is not None:
+            code, stamps = cached
+            return self.engine(source, path=self.path, name=filename, code=code,
+                               dependencies=[path for path, _ in stamps], stamps=stamps, loader=self)
+
+        template = self.engine(source, path=self.path, name=filename, loader=self)
+        self.bytecode_cache.dump(p, checksum, template)
+        return template
+
+
+class _CacheEntry(object):
+    """ A template cached by `Loader`, with the stamps of its files. """
+    def __init__(self, template, stamps):
+        self.template = template
+        self.stamps = stamps
+        self.checked = time.time()
+
+
+def _stamps(paths):
+    """ `(path, (mtime, size))` of the files, None for the missing ones. """
+    stamps = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamps.append((path, (st.st_mtime, st.st_size)))
+        except OSError:
+            stamps.append((path, None))
+    return stamps
+
+
+# atomic rename, over an existing file on Windows too.
+_replace = getattr(os, 'replace', os.rename)
+
+
+class BytecodeCache(object):
+    """ Directory of the compiled code of templates, like `__pycache__`,
+    so a new process loads the code of a template instead of compiling it:
 
-        return self.cache.get(p)
+        loader = Loader('templates', bytecode_cache=BytecodeCache('/tmp/flango'))
+
+    A cached code is used while the template source, its mtime, the files
+    it extends or includes and the Python version are the same.
+    """
+    # first bytes of the cache files, with the Python magic number.
+    MAGIC = b'flango-tplc5' + _PYTHON_MAGIC
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def filename(self, p):
+        return os.path.join(self.directory, hashlib.sha1(p.encode('utf-8')).hexdigest() + '.tplc')
+
+    def checksum(self, p, source):
+        if not isinstance(source, bytes):
+            source = source.encode('utf-8')
+        return hashlib.sha1(repr(os.path.getmtime(p)).encode('ascii') + source).hexdigest()
+
+    def load(self, p, checksum):
+        """ `(code, stamps)` of the template file `p`, None if it is not
+        cached or it or its dependencies changed since they were parsed.
+        """
+        try:
+            with open(self.filename(p), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        if not data.startswith(self.MAGIC):
+            return None
+        try:
+            cached_checksum, stamps, code = marshal.loads(data[len(self.MAGIC):])
+        except (ValueError, EOFError, TypeError):
+            return None
+        if cached_checksum != checksum:
+            return None
+        if _stamps(path for path, _ in stamps) != stamps:
+            return None
+        return code, stamps
+
+    def dump(self, p, checksum, template):
+        """ Store the code of `template`, errors are ignored. The stamps
+        of its dependencies are the ones they had when they were parsed,
+        not the current ones which may be newer than the compiled code.
+        """
+        try:
+            data = self.MAGIC + marshal.dumps((checksum, template.stamps, template.intermediate))
+            filename = self.filename(p)
+            # written aside then renamed, so other processes never read half a file.
+            tmp = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.current_thread().ident)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            _replace(tmp, filename)
+        except (IOError, OSError):
+            pass
+
+
+# their string never contains HTML special characters.
+_NUMBER_TYPES = frozenset([int, float, bool, type(2 ** 64)])
+
+
+class Markup(str):
+    """ A string which is already HTML, `escape` returns it unchanged:
+
+            >>> Template('{{ content }}', autoescape=True).render(content=Markup('<p>flango</p>'))
+            <p>flango</p>
+
+    Any object with an `__html__` method is treated the same way.
+    """
+    def __html__(self):
+        return self
+
+    def __repr__(self):
+        return 'Markup({0})'.format(str.__repr__(self))
 
 
 def escape(content):
-    """ Escapes a string's HTML. """
+    """ Escapes a string's HTML, the value is converted to a string
+    first unless it's `Markup`.
+
+    The chained `str.replace` calls each scan the string in C, they are
+    faster than a single pass with `str.translate` or a regex callback.
+    """
+    if type(content) is not str:
+        if type(content) in _NUMBER_TYPES:
+            return str(content)
+        if hasattr(content, '__html__'):
+            return content.__html__()
+        content = str(content)
     return content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')\
         .replace('"', '&quot;').replace("'", '&#039;')
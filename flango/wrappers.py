@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
-import threading
-import httplib
 from cgi import FieldStorage
-from urlparse import parse_qs
-from Cookie import SimpleCookie
-from collections import MutableMapping
+
+try:
+    import httplib
+    from urlparse import parse_qs
+    from Cookie import SimpleCookie
+except ImportError:  # Python 3
+    import http.client as httplib
+    from urllib.parse import parse_qs
+    from http.cookies import SimpleCookie
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+try:
+    text_type = unicode
+except NameError:  # Python 3
+    text_type = str
 
 
 class HttpHeaders(MutableMapping):
@@ -15,7 +29,7 @@ class HttpHeaders(MutableMapping):
     latest value added.
     """
     def __init__(self, **kwargs):
-        self._dict = {self.normalize_key(k): [v] for k, v in kwargs.iteritems()}
+        self._dict = {self.normalize_key(k): [v] for k, v in kwargs.items()}
 
     def __setitem__(self, key, value):
         self._dict.setdefault(self.normalize_key(key), []).append(value)
@@ -50,9 +64,50 @@ class HttpHeaders(MutableMapping):
         return '-'.join(w.capitalize() for w in key.split('-'))
 
 
-class BaseObject(threading.local):
+class FileWrapper(object):
+    """ Fallback of `wsgi.file_wrapper`: iterates over a file-like object
+    in blocks, `fileno` lets the servers use `os.sendfile` instead.
+    """
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def fileno(self):
+        return self.filelike.fileno()
+
+    def __iter__(self):
+        while True:
+            data = self.filelike.read(self.block_size)
+            if not data:
+                return
+            yield data
+
+
+class StreamBody(object):
+    """ Body of a streamed response: iterates over the chunks of `iterable`
+    as bytes, `close` closes `iterable` even if it was never iterated.
+    """
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            if not isinstance(chunk, bytes):
+                chunk = text_type(chunk).encode('utf-8')
+            yield chunk
+
+    def close(self):
+        if hasattr(self.iterable, 'close'):
+            self.iterable.close()
+
+
+class BaseObject(object):
     """Base class for request and response.
-    Provide a thread safe space.
+    Every request gets its own in its request context, so they are
+    neither shared between threads nor bound to one, the ASGI entry
+    point builds them on an executor thread and reads them on the loop.
     """
     pass
 
@@ -89,7 +144,7 @@ class Request(BaseObject):
             return self._args
 
         args = parse_qs(self.query)
-        for k, v in args.iteritems():
+        for k, v in args.items():
             if len(v) == 1:
                 self._args[k] = v[0]
             else:
@@ -121,6 +176,22 @@ class Request(BaseObject):
     def if_modified_since(self):
         return self.environ.get('HTTP_IF_MODIFIED_SINCE', '')
 
+    @property
+    def accept_encoding(self):
+        return self.environ.get('HTTP_ACCEPT_ENCODING', '')
+
+    @property
+    def if_none_match(self):
+        return self.environ.get('HTTP_IF_NONE_MATCH', '')
+
+    @property
+    def if_range(self):
+        return self.environ.get('HTTP_IF_RANGE', '')
+
+    @property
+    def range(self):
+        return self.environ.get('HTTP_RANGE', '')
+
 
 class Response(BaseObject):
 
@@ -131,8 +202,10 @@ class Response(BaseObject):
         self._status = code
         self.content_type = content_type
 
-        # body
+        # body, or a file or iterable streamed as the body.
         self._body = None
+        self.file = None
+        self.stream = None
         self.set_body(body)
 
     @property
@@ -143,26 +216,59 @@ class Response(BaseObject):
 
     def set_cookie(self, key, value, **kwargs):
         self.cookies[key] = value
-        for k, v in kwargs.iteritems():
+        for k, v in kwargs.items():
             self.cookies[key][k] = v
 
     @property
     def status(self):
         return ' '.join([str(self._status), httplib.responses.get(self._status)])
 
+    @property
+    def status_code(self):
+        return self._status
+
     def set_status(self, s):
         self._status = s
 
     @property
     def headerlist(self):
-        return self.headers.as_list()
+        headers = self.headers.as_list()
+        if self._cookies:
+            headers.extend(('Set-Cookie', morsel.OutputString()) for morsel in self._cookies.values())
+        return headers
 
     @property
     def body(self):
         return self._body
 
     def set_body(self, body):
-        self._body = str(body)
+        """ Generators and the other iterables, except strings, dicts and
+        the lists and tuples of chunks which are joined, are streamed chunk
+        by chunk instead of being held in memory.
+        """
+        self.stream = None
+        if isinstance(body, (list, tuple)):
+            body = b''.join(StreamBody(body))
+        elif hasattr(body, '__iter__') and not isinstance(body, (bytes, text_type, dict)):
+            self.stream = StreamBody(body)
+            self._body = b''
+            return
+        if not isinstance(body, bytes):
+            body = str(body)
+            if not isinstance(body, bytes):
+                # WSGI bodies are bytes on Python 3.
+                body = body.encode('utf-8')
+        self._body = body
+
+    def set_file(self, fileobj, length=None):
+        """ Stream the opened binary file `fileobj` as the body instead
+        of reading it into memory, the file is closed once sent.
+        """
+        self.file = fileobj
+        self.stream = None
+        self._body = b''
+        if length is not None:
+            self.headers['Content-Length'] = str(length)
 
     def get_content_type(self):
         return self.headers['Content-Type']
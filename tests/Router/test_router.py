@@ -1,6 +1,8 @@
 import unittest
 
-from flango.router import Router, RouterException
+import uuid
+
+from flango.router import Router, RouterException, BaseConverter, MethodNotAllowed
 
 
 def just_a_callable():
@@ -11,6 +13,16 @@ def another_callable():
     pass
 
 
+class ListConverter(BaseConverter):
+    regex = r'\w+(?:,\w+)*'
+
+    def to_python(self, value):
+        return value.split(',')
+
+    def to_url(self, value):
+        return ','.join(value)
+
+
 class RouterTest(unittest.TestCase):
 
     def setUp(self):
@@ -52,7 +64,7 @@ class RouterTest(unittest.TestCase):
     def test_get_with_int_args(self):
         self.router.register('/show/<int:id>', just_a_callable, ['GET'])
         self.assertEqual(
-            (just_a_callable, {'id': '1'}), self.router.get('/show/1'))
+            (just_a_callable, {'id': 1}), self.router.get('/show/1'))
 
     def test_url_for_with_not_callable(self):
         self.assertRaises(RouterException, self.router.url_for, '10')
@@ -83,3 +95,142 @@ class RouterTest(unittest.TestCase):
         self.router.register('/post', another_callable, ['GET'])
         r = self.router.all_callables()
         self.assertEqual(set(r), set([another_callable, just_a_callable]))
+
+    def test_get_with_many_rules(self):
+        for i in range(300):
+            self.router.register('/post{0}/<int:id>'.format(i), just_a_callable, ['GET'])
+        self.router.register('/post299/about', another_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'id': 7}), self.router.get('/post299/7'))
+        self.assertEqual(
+            (another_callable, None), self.router.get('/post299/about'))
+        self.assertRaises(RouterException, self.router.get, '/post299/7/8')
+
+    def test_get_with_args_in_segment(self):
+        self.router.register('/post<int:id>', just_a_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'id': 3}), self.router.get('/post3'))
+        self.assertRaises(RouterException, self.router.get, '/postx')
+
+    def test_get_with_no_matched_rule(self):
+        self.router.register('/post/<name>', just_a_callable, ['GET'])
+        self.assertRaises(RouterException, self.router.get, '/post')
+        self.assertRaises(RouterException, self.router.get, '/tag/flango')
+
+    def test_url_for_with_replaced_rule(self):
+        self.router.register('/post', just_a_callable, ['GET'])
+        self.router.register('/post', another_callable, ['GET'])
+        self.assertEqual('/post', self.router.url_for(another_callable))
+        self.assertRaises(
+            RouterException, self.router.url_for, just_a_callable)
+
+    def test_get_with_many_args(self):
+        self.router.register('/archive/<int:year>/<int:month>/<slug:title>', just_a_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'year': 2015, 'month': 10, 'title': 'hello-flango'}),
+            self.router.get('/archive/2015/10/hello-flango'))
+
+    def test_get_with_args_in_one_segment(self):
+        self.router.register('/price/<int:low>-<float:high>', just_a_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'low': 1, 'high': 2.5}), self.router.get('/price/1-2.5'))
+
+    def test_get_with_path_args(self):
+        self.router.register('/files/<path:name>/edit', just_a_callable, ['GET'])
+        self.router.register('/files/<path:name>', another_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'name': 'a/b.txt'}), self.router.get('/files/a/b.txt/edit'))
+        self.assertEqual(
+            (another_callable, {'name': 'a/b.txt'}), self.router.get('/files/a/b.txt'))
+
+    def test_get_with_uuid_args(self):
+        value = uuid.uuid4()
+        self.router.register('/user/<uuid:uid>', just_a_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'uid': value}), self.router.get('/user/{0}'.format(value)))
+        self.assertRaises(RouterException, self.router.get, '/user/1234')
+
+    def test_register_with_unknown_converter(self):
+        self.assertRaises(
+            RouterException, self.router.register, '/<list:tags>', just_a_callable, ['GET'])
+
+    def test_register_with_duplicated_args(self):
+        self.assertRaises(
+            RouterException, self.router.register, '/<a>/<a>', just_a_callable, ['GET'])
+
+    def test_custom_converter(self):
+        self.router.add_converter('list', ListConverter)
+        self.router.register('/tags/<list:tags>', just_a_callable, ['GET'])
+        self.assertEqual(
+            (just_a_callable, {'tags': ['a', 'b']}), self.router.get('/tags/a,b'))
+        self.assertEqual(
+            '/tags/a,b', self.router.url_for(just_a_callable, tags=['a', 'b']))
+
+    def test_url_for_with_many_args(self):
+        self.router.register('/archive/<int:year>/<int:month>', just_a_callable, ['GET'])
+        self.assertEqual(
+            '/archive/2015/10', self.router.url_for(just_a_callable, year=2015, month='10'))
+        self.assertRaises(
+            RouterException, self.router.url_for, just_a_callable, year=2015)
+
+    def test_get_dispatch_by_method(self):
+        self.router.register('/post', just_a_callable, ['GET'])
+        self.router.register('/post', another_callable, ['POST'])
+        self.assertEqual((just_a_callable, None), self.router.get('/post', 'GET'))
+        self.assertEqual((another_callable, None), self.router.get('/post', 'POST'))
+
+    def test_get_with_method_not_allowed(self):
+        self.router.register('/post/<int:id>', just_a_callable, ['GET', 'PUT'])
+        try:
+            self.router.get('/post/1', 'DELETE')
+        except MethodNotAllowed as e:
+            self.assertEqual(e.allowed, ['GET', 'HEAD', 'OPTIONS', 'PUT'])
+        else:
+            self.fail('MethodNotAllowed not raised')
+        self.assertRaises(RouterException, self.router.get, '/post/a', 'DELETE')
+
+    def test_get_method_of_another_rule(self):
+        self.router.register('/post/new', just_a_callable, ['GET'])
+        self.router.register('/post/<name>', another_callable, ['POST'])
+        self.assertEqual((another_callable, {'name': 'new'}), self.router.get('/post/new', 'POST'))
+        try:
+            self.router.get('/post/new', 'PUT')
+        except MethodNotAllowed as e:
+            self.assertEqual(e.allowed, ['GET', 'HEAD', 'OPTIONS', 'POST'])
+        else:
+            self.fail('MethodNotAllowed not raised')
+
+    def test_get_head_with_get_rule(self):
+        self.router.register('/', just_a_callable, ['GET'])
+        self.assertEqual((just_a_callable, None), self.router.get('/', 'HEAD'))
+
+    def test_allowed_methods(self):
+        self.router.register('/post', just_a_callable, ['POST'])
+        self.assertEqual(['OPTIONS', 'POST'], self.router.allowed_methods('/post'))
+        self.assertEqual([], self.router.allowed_methods('/tag'))
+
+    def test_get_with_cache(self):
+        router = Router(cache_size=2)
+        router.register('/post/<int:id>', just_a_callable, ['GET'])
+        self.assertEqual((just_a_callable, {'id': 1}), router.get('/post/1'))
+        self.assertEqual((just_a_callable, {'id': 1}), router.get('/post/1'))
+        router.get('/post/2')
+        router.get('/post/3')
+        self.assertEqual((1, 3, 2, 2), router.cache_info())
+        # '/post/1' has been evicted.
+        router.get('/post/1')
+        self.assertEqual((1, 4, 2, 2), router.cache_info())
+
+    def test_get_with_cache_cleared_on_register(self):
+        router = Router(cache_size=8)
+        router.register('/post/<int:id>', just_a_callable, ['GET'])
+        router.get('/post/1')
+        router.register('/post/1', another_callable, ['GET'])
+        self.assertEqual(0, router.cache_info().currsize)
+        self.assertEqual((another_callable, None), router.get('/post/1'))
+
+    def test_get_with_cache_and_no_matched_rule(self):
+        router = Router(cache_size=8)
+        router.register('/', just_a_callable, ['GET'])
+        self.assertRaises(RouterException, router.get, '/post')
+        self.assertEqual(0, router.cache_info().currsize)
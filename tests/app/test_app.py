@@ -1,12 +1,15 @@
 import os
 import sys
 import time
+import threading
 import unittest
 from cStringIO import StringIO
 
 
-from flango.flango import Flango, _Stack
+from flango.flango import Flango, _Stack, _ctx_stack
 from flango.router import RouterException
+from flango.wrappers import Response
+from flango.template import Loader, Markup
 
 
 def start_response(status, headerlist):
@@ -19,6 +22,7 @@ class SimpleClass(object):
 app = Flango('__main__')
 
 app.root_path = os.path.dirname(os.path.abspath(__file__))
+app.loader = Loader(os.path.join(app.root_path, 'template'))
 
 
 @app.route('/', methods=["GET", "POST"])
@@ -42,6 +46,33 @@ def post():
 def sync_args(id):
     return id
 
+@app.route('/stream')
+def stream():
+    app.response.headers['X-Stream'] = 'yes'
+    for i in range(3):
+        yield 'line {0}\n'.format(i)
+
+
+@app.route('/stream_error')
+def stream_error():
+    raise RuntimeError
+    yield 'line'
+
+
+streamed = []
+
+
+@app.route('/stream_response')
+def stream_response():
+    def lines():
+        try:
+            for i in range(3):
+                streamed.append(i)
+                yield str(i)
+        finally:
+            streamed.append('closed')
+    return Response(lines(), content_type='text/csv')
+
 # template
 
 
@@ -50,6 +81,11 @@ def template():
     return app.render('index.html')
 
 
+@app.route('/template_stream')
+def template_stream():
+    return app.stream('test_escape.html', unescape=lambda c: c, content='streamed')
+
+
 @app.route('/url_for_with_args')
 def url_for_with_args():
     return app.url_for(sync_args, id=1)
@@ -91,6 +127,12 @@ def redirect_with_url():
     return app.redirect(app.url_for(sync_args, id=1))
 
 
+@app.route('/echo/<name>')
+def echo(name):
+    time.sleep(0.01)
+    return app.request.path
+
+
 @app.route('/test_handler_exception')
 def handler_exception():
     raise RuntimeError
@@ -145,6 +187,31 @@ class AppTest(unittest.TestCase):
         self.assertEqual(
             app.url_for('static', 'style.css'), 'http://localhost/static/style.css')
 
+    def test_static_url_for_without_query_string(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'QUERY_STRING': 'page=2'
+        }
+        r = app(env, start_response)
+        self.assertEqual(
+            app.url_for('static', 'style.css'), 'http://localhost/static/style.css')
+
+    def test_static_url_for_cache_per_host(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+        }
+        r = app(env, start_response)
+        app.url_for('static', 'style.css')
+        r.close()
+        env['HTTP_HOST'] = 'www.example.com'
+        r = app(env, start_response)
+        self.assertEqual(
+            app.url_for('static', 'style.css'), 'http://www.example.com/static/style.css')
+
     def test_static_url_for_with_http_standard_port(self):
         env = {
             'HTTP_HOST': 'localhost',
@@ -205,6 +272,79 @@ class AppTest(unittest.TestCase):
         r = app(env, start_response)
         self.assertEqual(app._response.status, '404 Not Found')
 
+    def test_method_not_allowed(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/',
+            'REQUEST_METHOD': 'PUT'
+        }
+        r = app(env, start_response)
+        self.assertEqual(app._response.status, '405 Method Not Allowed')
+        self.assertEqual(app._response.headers['Allow'], 'GET, HEAD, OPTIONS, POST')
+
+    def test_options(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/json',
+            'REQUEST_METHOD': 'OPTIONS'
+        }
+        r = app(env, start_response)
+        self.assertEqual(app._response.status, '200 OK')
+        self.assertEqual(app._response.headers['Allow'], 'GET, HEAD, OPTIONS')
+
+    def test_head(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/',
+            'REQUEST_METHOD': 'HEAD'
+        }
+        r = app(env, start_response)
+        self.assertEqual(app._response.status, '200 OK')
+        self.assertEqual(list(r), [''])
+
+    def test_concurrent_requests(self):
+        results = {}
+
+        def request(name):
+            env = {
+                'HTTP_HOST': 'localhost',
+                'wsgi.url_scheme': 'http',
+                'SERVER_PORT': '80',
+                'PATH_INFO': '/echo/' + name
+            }
+            r = app(env, start_response)
+            results[name] = (list(r), app.request.path)
+            r.close()
+
+        threads = [threading.Thread(target=request, args=(str(i), )) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            path = '/echo/{0}'.format(i)
+            self.assertEqual(results[str(i)], ([path], path))
+
+    def test_context_popped_on_close(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/'
+        }
+        depth = len(_ctx_stack)
+        r = app(env, start_response)
+        self.assertEqual(len(_ctx_stack), depth + 1)
+        self.assertEqual(app.request.path, '/')
+        r.close()
+        self.assertEqual(len(_ctx_stack), depth)
+
     def test_redirect(self):
         env = {
             'HTTP_HOST': 'localhost',
@@ -287,6 +427,98 @@ class AppTest(unittest.TestCase):
         self.assertEqual(app._response.status, '200 OK')
         self.assertEqual(app._response.body, b'1')
 
+    def test_stream_generator_view(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/stream'
+        }
+        started = []
+        r = app(env, lambda status, headerlist: started.append((status, dict(headerlist))))
+        # the headers set before the first chunk are passed to start_response.
+        [(status, headers)] = started
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['X-Stream'], 'yes')
+        self.assertFalse('Content-Length' in headers)
+        self.assertEqual(list(r), [b'line 0\n', b'line 1\n', b'line 2\n'])
+        r.close()
+
+    def test_stream_error_before_first_chunk(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/stream_error'
+        }
+        started = []
+        r = app(env, lambda status, headerlist: started.append(status))
+        self.assertEqual(started, ['500 Internal Server Error'])
+        r.close()
+
+    def test_stream_response(self):
+        del streamed[:]
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/stream_response'
+        }
+        r = app(env, start_response)
+        # only the first chunk is produced before the server iterates.
+        self.assertEqual(streamed, [0])
+        chunks = iter(r)
+        self.assertEqual(next(chunks), b'0')
+        self.assertEqual(streamed, [0])
+        r.close()
+        self.assertEqual(streamed, [0, 'closed'])
+
+    def test_stream_head(self):
+        del streamed[:]
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/stream_response',
+            'REQUEST_METHOD': 'HEAD'
+        }
+        r = app(env, start_response)
+        self.assertEqual(list(r), [b''])
+        r.close()
+        self.assertEqual(streamed, [])
+
+    def test_stream_template(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/template_stream'
+        }
+        r = app(env, start_response)
+        rendered = app.render('test_escape.html', unescape=lambda c: c, content='streamed')
+        self.assertEqual(b''.join(r), rendered.encode('utf-8'))
+        self.assertTrue('<p>streamed</p>' in rendered)
+        r.close()
+
+    def test_template_namespace(self):
+        namespace = app.template_namespace
+        self.assertTrue(namespace['Response'] is Response)
+        self.assertTrue(namespace['Markup'] is Markup)
+        self.assertTrue(app.template_namespace is namespace)
+        app.reset_template_namespace()
+        self.assertFalse(app.template_namespace is namespace)
+
+    def test_tuple_body(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/test_args',
+            'QUERY_STRING': 'key=test&count=5'
+        }
+        r = app(env, start_response)
+        self.assertEqual(list(r), [b'test5'])
+
     def test_handle_static(self):
         env = {
             'HTTP_HOST': 'localhost',
@@ -298,6 +530,36 @@ class AppTest(unittest.TestCase):
         self.assertEqual(app._response.status, '200 OK')
         self.assertEqual(app._response.content_type, 'text/css')
 
+    def test_handle_static_streamed(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/static/style.css'
+        }
+        r = app(env, start_response)
+        with open(os.path.join(app.root_path, 'static', 'style.css'), 'rb') as f:
+            content = f.read()
+        self.assertEqual(b''.join(r), content)
+        self.assertEqual(app._response.headers['Content-Length'], str(len(content)))
+        r.close()
+
+    def test_handle_static_with_file_wrapper(self):
+        class Wrapper(object):
+            def __init__(self, filelike, block_size):
+                self.filelike = filelike
+
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/static/style.css',
+            'wsgi.file_wrapper': Wrapper
+        }
+        r = app(env, start_response)
+        self.assertTrue(isinstance(r, Wrapper))
+        r.filelike.close()
+
     def test_handle_static_not_found(self):
         env = {
             'HTTP_HOST': 'localhost',
@@ -0,0 +1,181 @@
+import os
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from flango.flango import Flango
+
+
+app = Flango('__main__')
+app.root_path = os.path.dirname(os.path.abspath(__file__))
+
+
+@app.route('/sync/<int:id>', methods=['GET', 'POST'])
+def sync_view(id):
+    if app.request.method == 'POST':
+        return app.request.forms['title']
+    return '{0} {1}'.format(id, app.request.path)
+
+
+@app.route('/redirect')
+def redirect_view():
+    return app.redirect('/sync/1')
+
+
+@app.route('/json')
+def json_view():
+    return app.jsonify(name='flango')
+
+
+@app.route('/header')
+def header_view():
+    app.response.headers['X-Flango'] = 'sync'
+    app.response.set_cookie('name', 'flango')
+    return 'header'
+
+
+@app.route('/stream')
+def stream_view():
+    app.response.headers['X-Stream'] = 'yes'
+    for i in range(3):
+        yield str(i)
+
+
+@app.route('/stream_error')
+def stream_error():
+    raise RuntimeError
+    yield 'line'
+
+
+if asyncio is not None:
+    # `async def` is a syntax error on Python 2.
+    exec('''
+@app.route('/async/<int:id>')
+async def async_view(id):
+    await asyncio.sleep(0.01)
+    return '{0} {1}'.format(id, app.request.path)
+
+
+@app.route('/async_error')
+async def async_error():
+    raise RuntimeError
+''')
+
+
+def call(path, method='GET', body=b'', headers=()):
+    """ Start an ASGI request, return its future and the sent messages. """
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': b'', 'headers': list(headers)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    def done(result):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(result)
+        return future
+
+    def receive():
+        return done(messages.pop(0))
+
+    def send(message):
+        sent.append(message)
+        return done(None)
+
+    return app.asgi(scope, receive, send), sent
+
+
+def run(*requests):
+    """ Run the requests concurrently, return the messages sent for each. """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        calls = [call(*r) for r in requests]
+        loop.run_until_complete(asyncio.gather(*[future for future, _ in calls]))
+        return [sent for _, sent in calls]
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class ASGITest(unittest.TestCase):
+
+    def test_async_views_run_concurrently(self):
+        results = run(*[('/async/{0}'.format(i), ) for i in range(5)])
+        for i, (start, body) in enumerate(results):
+            self.assertEqual(start['status'], 200)
+            self.assertEqual(body['body'], '{0} /async/{0}'.format(i).encode())
+
+    def test_sync_view(self):
+        (start, body), = run(('/sync/1', ))
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(body['body'], b'1 /sync/1')
+
+    def test_sync_view_with_form(self):
+        headers = [(b'content-type', b'application/x-www-form-urlencoded'), (b'content-length', b'10')]
+        (start, body), = run(('/sync/1', 'POST', b'title=test', headers))
+        self.assertEqual(body['body'], b'test')
+
+    def test_stream(self):
+        [sent] = run(('/stream', ))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(dict(sent[0]['headers'])[b'x-stream'], b'yes')
+        self.assertEqual([m['body'] for m in sent[1:]], [b'0', b'1', b'2', b''])
+        self.assertFalse(sent[-1]['more_body'])
+
+    def test_stream_error_before_first_chunk(self):
+        (start, body), = run(('/stream_error', ))
+        self.assertEqual(start['status'], 500)
+        self.assertEqual(body['body'], b'500 Internal Server Error')
+
+    def test_static_file(self):
+        [sent] = run(('/static/style.css', ))
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(headers[b'content-type'], b'text/css')
+        with open(os.path.join(app.root_path, 'static', 'style.css'), 'rb') as f:
+            content = f.read()
+        self.assertEqual(headers[b'content-length'], str(len(content)).encode())
+        self.assertTrue(b'etag' in headers)
+        self.assertEqual(b''.join(m['body'] for m in sent[1:]), content)
+
+    def test_redirect(self):
+        (start, body), = run(('/redirect', ))
+        self.assertEqual(start['status'], 302)
+        self.assertEqual(dict(start['headers'])[b'location'], b'/sync/1')
+
+    def test_jsonify(self):
+        (start, body), = run(('/json', ))
+        self.assertEqual(dict(start['headers'])[b'content-type'], b'application/json')
+        self.assertEqual(body['body'], b'{"name": "flango"}')
+
+    def test_sync_view_headers(self):
+        (start, body), = run(('/header', ))
+        headers = start['headers']
+        self.assertTrue((b'x-flango', b'sync') in headers)
+        self.assertTrue(any(name == b'set-cookie' and value.startswith(b'name=flango') for name, value in headers))
+        self.assertEqual(body['body'], b'header')
+
+    def test_head(self):
+        (start, body), = run(('/sync/1', 'HEAD'))
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(body['body'], b'')
+
+    def test_not_found(self):
+        (start, body), = run(('/hello', ))
+        self.assertEqual(start['status'], 404)
+
+    def test_async_error(self):
+        (start, body), = run(('/async_error', ))
+        self.assertEqual(start['status'], 500)
+
+    def test_async_view_with_wsgi(self):
+        body = list(app({'PATH_INFO': '/async/3'}, lambda status, headers: None))
+        self.assertEqual(body, [b'3 /async/3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from flango.flango import Flango
+from flango.compress import Compression, accepts_gzip, is_compressible, gzip_bytes
+
+
+def start_response(status, headerlist):
+    pass
+
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class HelpersTest(unittest.TestCase):
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip('gzip, deflate, br'))
+        self.assertTrue(accepts_gzip('deflate, gzip;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip('gzip;q=0, *'))
+        self.assertFalse(accepts_gzip('identity'))
+        self.assertFalse(accepts_gzip(''))
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible('text/html; charset=utf-8'))
+        self.assertTrue(is_compressible('application/javascript'))
+        self.assertTrue(is_compressible('image/svg+xml'))
+        self.assertFalse(is_compressible('image/png'))
+        self.assertFalse(is_compressible('application/zip'))
+
+    def test_gzip_bytes(self):
+        data = b'flango ' * 100
+        self.assertEqual(gunzip(gzip_bytes(data)), data)
+        self.assertEqual(gzip_bytes(data), gzip_bytes(data))
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'static'))
+        self.app = Flango('__main__', compression=Compression(min_size=100))
+        self.app.root_path = self.root
+
+        @self.app.route('/big')
+        def big():
+            return 'flango ' * 100
+
+        @self.app.route('/stream')
+        def stream():
+            for i in range(3):
+                yield 'flango {0}\n'.format(i)
+
+        @self.app.route('/small')
+        def small():
+            return 'flango'
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, 'static', name), 'wb') as f:
+            f.write(content)
+
+    def get(self, path, **headers):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': path
+        }
+        env.update(headers)
+        r = self.app(env, start_response)
+        response, body = self.app._response, b''.join(r)
+        r.close()
+        return response, body
+
+    def test_dynamic_body(self):
+        response, body = self.get('/big', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gunzip(body), b'flango ' * 100)
+
+    def test_stream(self):
+        response, body = self.get('/stream', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gunzip(body), b'flango 0\nflango 1\nflango 2\n')
+
+    def test_dynamic_body_not_accepted(self):
+        response, body = self.get('/big')
+        self.assertFalse('Content-Encoding' in response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(body, b'flango ' * 100)
+
+    def test_dynamic_body_below_threshold(self):
+        response, body = self.get('/small', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse('Content-Encoding' in response.headers)
+        self.assertEqual(body, b'flango')
+
+    def test_static_built_once(self):
+        self.write('app.js', b'var flango = 1;\n' * 100)
+        response, body = self.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.headers['Content-Length'], str(len(body)))
+        self.assertEqual(gunzip(body), b'var flango = 1;\n' * 100)
+        self.assertTrue(response.headers['Content-Type'].endswith('javascript'))
+        gzipped = self.app.compression._entries[os.path.join(self.root, 'static', 'app.js')][1]
+        self.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(self.app.compression._entries[gzipped.abspath][1] is gzipped)
+
+        identity, body = self.get('/static/app.js')
+        self.assertFalse('Content-Encoding' in identity.headers)
+        self.assertNotEqual(identity.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(body, b'var flango = 1;\n' * 100)
+
+    def test_static_sibling(self):
+        self.write('style.css', b'body {}')
+        self.write('style.css.gz', gzip_bytes(b'prebuilt'))
+        response, body = self.get('/static/style.css', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Content-Type'], 'text/css')
+        self.assertEqual(gunzip(body), b'prebuilt')
+
+    def test_static_range_not_compressed(self):
+        self.write('style.css', b'body {}' * 100)
+        response, body = self.get('/static/style.css', HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertFalse('Content-Encoding' in response.headers)
+        self.assertEqual(body, b'body')
+
+    def test_static_compressed_type(self):
+        self.write('logo.png', b'\x89PNG' * 100)
+        response, body = self.get('/static/logo.png', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse('Content-Encoding' in response.headers)
+        self.assertFalse('Vary' in response.headers)
+
+    def test_not_modified_gzipped(self):
+        self.write('app.js', b'var flango = 1;\n' * 100)
+        response, _ = self.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        response, _ = self.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip',
+                               HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status, '304 Not Modified')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,342 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from flango.flango import Flango
+from flango.static import AssetManifest, StaticCache, load_entry, parse_range, etag_matches, modified_since
+
+
+def start_response(status, headerlist):
+    pass
+
+
+class StaticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_load_entry(self):
+        path = self.write('app.css', b'body {...}')
+        entry = load_entry(path)
+        self.assertEqual(entry.size, 10)
+        self.assertEqual(entry.content_type, 'text/css')
+        self.assertTrue(entry.last_modified.endswith(' UTC'))
+        self.assertTrue(entry.etag.startswith('"'))
+        self.assertEqual(entry.data, None)
+        self.assertEqual(load_entry(os.path.join(self.root, 'missing.css')), None)
+        self.assertEqual(load_entry(self.root), None)
+
+    def test_small_files_in_memory(self):
+        small = self.write('small.css', b'a' * 10)
+        large = self.write('large.css', b'a' * 100)
+        cache = StaticCache(max_file_size=50)
+        self.assertEqual(cache.get(small).data, b'a' * 10)
+        self.assertEqual(cache.get(large).data, None)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 10)
+
+    def test_revalidation_interval(self):
+        path = self.write('style.css', b'old')
+        cache = StaticCache(check_interval=60)
+        entry = cache.get(path)
+        self.write('style.css', b'newer')
+        # not checked again before the interval
+        self.assertTrue(cache.get(path) is entry)
+        entry.checked -= 60
+        self.assertEqual(cache.get(path).data, b'newer')
+        self.assertEqual(cache.size, 5)
+
+    def test_unchanged_file_keeps_entry(self):
+        path = self.write('style.css', b'body')
+        cache = StaticCache(check_interval=0)
+        entry = cache.get(path)
+        self.assertTrue(cache.get(path) is entry)
+
+    def test_removed_file(self):
+        path = self.write('style.css', b'body')
+        cache = StaticCache(check_interval=0)
+        cache.get(path)
+        os.remove(path)
+        self.assertEqual(cache.get(path), None)
+        self.assertFalse(path in cache)
+        self.assertEqual(cache.size, 0)
+
+    def test_lru_eviction(self):
+        a = self.write('a.css', b'a' * 10)
+        b = self.write('b.css', b'b' * 10)
+        c = self.write('c.css', b'c' * 10)
+        cache = StaticCache(max_size=20)
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        cache.get(c)
+        self.assertTrue(a in cache)
+        self.assertFalse(b in cache)
+        self.assertTrue(c in cache)
+        self.assertEqual(cache.size, 20)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class ConditionalTest(unittest.TestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), [(0, 10)])
+        self.assertEqual(parse_range('bytes=90-', 100), [(90, 10)])
+        self.assertEqual(parse_range('bytes=-10', 100), [(90, 10)])
+        self.assertEqual(parse_range('bytes=-200', 100), [(0, 100)])
+        self.assertEqual(parse_range('bytes=95-200', 100), [(95, 5)])
+        self.assertEqual(parse_range('bytes=0-0, 10-19', 100), [(0, 1), (10, 10)])
+        self.assertEqual(parse_range('bytes=10-19, 0-0', 100), [(0, 1), (10, 10)])
+        self.assertEqual(parse_range('bytes=0-9, 5-14, 15-19', 100), [(0, 20)])
+        self.assertEqual(parse_range('bytes=0-, 0-, 0-', 100), [(0, 100)])
+        self.assertEqual(parse_range('bytes=100-', 100), [])
+        self.assertEqual(parse_range('bytes=9-0', 100), None)
+        self.assertEqual(parse_range('bytes=a-b', 100), None)
+        self.assertEqual(parse_range('items=0-9', 100), None)
+        self.assertEqual(parse_range('bytes=' + ','.join(['0-1'] * 20), 100), None)
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertFalse(etag_matches('W/"b"', '"b"', weak=False))
+        self.assertFalse(etag_matches('"b"', 'W/"b"', weak=False))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+
+    def test_modified_since(self):
+        entry = load_entry(os.path.abspath(__file__))
+        self.assertFalse(modified_since(entry.last_modified, entry))
+        self.assertFalse(modified_since('Fri, 01 Jan 2100 00:00:00 GMT', entry))
+        self.assertTrue(modified_since('Thu, 01 Jan 1970 00:00:00 GMT', entry))
+        self.assertTrue(modified_since('yesterday', entry))
+
+
+class CachedStaticTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flango('__main__', static_cache=StaticCache())
+        self.app.root_path = os.path.dirname(os.path.abspath(__file__))
+
+    def test_served_from_memory(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/static/style.css'
+        }
+        r = self.app(env, start_response)
+        with open(os.path.join(self.app.root_path, 'static', 'style.css'), 'rb') as f:
+            content = f.read()
+        self.assertEqual(b''.join(r), content)
+        response = self.app._response
+        self.assertEqual(response.file, None)
+        self.assertEqual(response.content_type, 'text/css')
+        self.assertEqual(response.headers['Content-Length'], str(len(content)))
+        self.assertTrue('ETag' in response.headers)
+        self.assertEqual(len(self.app.static_cache), 1)
+        r.close()
+
+    def test_not_found(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/static/main.css'
+        }
+        self.app(env, start_response)
+        self.assertEqual(self.app._response.status, '404 Not Found')
+        self.assertEqual(len(self.app.static_cache), 0)
+
+
+class StaticRangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flango('__main__')
+        self.app.root_path = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(self.app.root_path, 'static', 'style.css'), 'rb') as f:
+            self.content = f.read()
+
+    def get(self, **headers):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': '/static/style.css'
+        }
+        env.update(headers)
+        r = self.app(env, start_response)
+        response, body = self.app._response, b''.join(r)
+        r.close()
+        return response, body
+
+    def test_if_none_match(self):
+        response, _ = self.get()
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        response, _ = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status, '304 Not Modified')
+        self.assertEqual(response.headers['ETag'], etag)
+        # If-None-Match takes precedence over If-Modified-Since
+        response, _ = self.get(HTTP_IF_NONE_MATCH='"other"',
+                               HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status, '200 OK')
+
+    def test_single_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=2-11')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[2:12])
+        self.assertEqual(response.headers['Content-Length'], '10')
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes 2-11/{0}'.format(len(self.content)))
+
+    def test_single_range_cached(self):
+        self.app.static_cache = StaticCache()
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[-5:])
+
+    def test_multiple_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-3,10-13')
+        self.assertEqual(response.status_code, 206)
+        content_type = response.headers['Content-Type']
+        self.assertTrue(content_type.startswith('multipart/byteranges; boundary='))
+        boundary = content_type.split('=', 1)[1].encode('ascii')
+        parts = body.split(b'--' + boundary)
+        self.assertEqual(len(parts), 4)
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + self.content[0:4] + b'\r\n'))
+        self.assertTrue(b'Content-Range: bytes 10-13/' in parts[2])
+        self.assertTrue(parts[2].endswith(b'\r\n\r\n' + self.content[10:14] + b'\r\n'))
+        self.assertEqual(parts[3], b'--\r\n')
+        self.assertEqual(response.headers['Content-Length'], str(len(body)))
+        # streamed from the disk, not built in memory.
+        self.assertTrue(response.stream is not None)
+
+    def test_multiple_ranges_cached(self):
+        self.app.static_cache = StaticCache()
+        response, body = self.get(HTTP_RANGE='bytes=0-3,10-13')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(self.content[10:14] + b'\r\n' in body)
+        self.assertEqual(response.headers['Content-Length'], str(len(body)))
+
+    def test_overlapping_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-5,2-9,0-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes 0-{0}/{1}'.format(len(self.content) - 1, len(self.content)))
+
+    def test_unsatisfiable_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes */{0}'.format(len(self.content)))
+        self.assertEqual(body, b'')
+
+    def test_if_range(self):
+        response, _ = self.get()
+        etag = response.headers['ETag']
+        response, body = self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response, body = self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+
+
+class AssetManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'static'))
+        os.mkdir(os.path.join(self.root, 'static', 'js'))
+        self.write('js/app.js', b'var a = 1;')
+        self.app = Flango('__main__', fingerprint_static=True)
+        self.app.root_path = self.root
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, 'static', name), 'wb') as f:
+            f.write(content)
+
+    def get(self, path):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+            'PATH_INFO': path
+        }
+        r = self.app(env, start_response)
+        response, body = self.app._response, b''.join(r)
+        r.close()
+        return response, body
+
+    def test_build(self):
+        manifest = AssetManifest(os.path.join(self.root, 'static'), length=6)
+        manifest.build()
+        fingerprinted = manifest.get('js/app.js')
+        self.assertTrue(fingerprinted.startswith('js/app.'))
+        self.assertTrue(fingerprinted.endswith('.js'))
+        self.assertEqual(len(fingerprinted), len('js/app.123456.js'))
+        self.assertEqual(manifest.resolve(fingerprinted), 'js/app.js')
+        self.assertEqual(manifest.resolve('js/app.js'), None)
+        self.assertEqual(manifest.get('js/main.js'), None)
+
+    def test_changed_file(self):
+        manifest = AssetManifest(os.path.join(self.root, 'static'), check_interval=0)
+        old = manifest.get('js/app.js')
+        self.write('js/app.js', b'var a = 2; // changed')
+        new = manifest.get('js/app.js')
+        self.assertNotEqual(old, new)
+        self.assertEqual(manifest.resolve(old), None)
+        self.assertEqual(manifest.resolve(new), 'js/app.js')
+
+    def test_url_for_and_serve(self):
+        env = {
+            'HTTP_HOST': 'localhost',
+            'wsgi.url_scheme': 'http',
+            'SERVER_PORT': '80',
+        }
+        r = self.app(env, start_response)
+        url = self.app.url_for('static', 'js/app.js')
+        r.close()
+        path = '/static/' + self.app.manifest.get('js/app.js')
+        self.assertEqual(url, 'http://localhost' + path)
+
+        response, body = self.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'var a = 1;')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response, body = self.get('/static/js/app.js')
+        self.assertEqual(body, b'var a = 1;')
+        self.assertFalse('Cache-Control' in response.headers)
+
+        response, _ = self.get('/static/js/app.0000000000.js')
+        self.assertEqual(response.status_code, 404)
+
+    def test_serve_before_url_for(self):
+        fingerprinted = AssetManifest(os.path.join(self.root, 'static')).get('js/app.js')
+        response, body = self.get('/static/' + fingerprinted)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'var a = 1;')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response, _ = self.get('/static/js/app.00000000.js')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+import os
+import time
+import signal
+import socket
+import threading
+import unittest
+import tempfile
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+from flango.server import ServerAdapter, ThreadedWSGIServer, PreforkServer, AsyncioServer, RequestHandler, asyncio
+from flango.flango import Flango
+from flango.static import FileRange
+
+
+class QuietHandler(RequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def slow_app(environ, start_response):
+    time.sleep(0.3)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'slow']
+
+
+def file_app(environ, start_response):
+    f = open(environ['FILE'], 'rb')
+    size = os.path.getsize(environ['FILE'])
+    start_response('200 OK', [('Content-Type', 'application/octet-stream'), ('Content-Length', str(size))])
+    return environ['wsgi.file_wrapper'](f, 8192)
+
+
+def range_app(environ, start_response):
+    f = FileRange(open(environ['FILE'], 'rb'), 1000, 5000)
+    start_response('206 Partial Content', [('Content-Type', 'application/octet-stream'), ('Content-Length', '5000')])
+    return environ['wsgi.file_wrapper'](f, 8192)
+
+
+def pid_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+def get(port, path='/'):
+    for _ in range(50):
+        try:
+            response = urlopen('http://127.0.0.1:{0}{1}'.format(port, path), timeout=5)
+        except IOError:
+            # the server is not listening yet.
+            time.sleep(0.1)
+            continue
+        try:
+            return response.read()
+        finally:
+            response.close()
+    raise RuntimeError('Server is not running.')
+
+
+class ServerAdapterTest(unittest.TestCase):
+
+    def test_run_not_implemented(self):
+        self.assertRaises(NotImplementedError, ServerAdapter().run, None)
+
+    def test_repr(self):
+        self.assertEqual(repr(ThreadedWSGIServer('localhost', 80)), 'ThreadedWSGIServer (localhost:80)')
+
+
+def make_file(size):
+    f = tempfile.NamedTemporaryFile(delete=False)
+    f.write(os.urandom(size))
+    f.close()
+    return f.name
+
+
+class ThreadedWSGIServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        self.server = ThreadedWSGIServer(port=self.port, threads=4, handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.run, args=(self.dispatch, ))
+        self.thread.daemon = True
+        self.thread.start()
+        get(self.port)
+
+    def tearDown(self):
+        self.server.httpd.shutdown()
+        self.thread.join()
+
+    def dispatch(self, environ, start_response):
+        if environ['PATH_INFO'] == '/file':
+            environ['FILE'] = self.filename
+            return file_app(environ, start_response)
+        if environ['PATH_INFO'] == '/range':
+            environ['FILE'] = self.filename
+            return range_app(environ, start_response)
+        return slow_app(environ, start_response)
+
+    def test_sendfile(self):
+        self.filename = make_file(1 << 20)
+        self.addCleanup(os.remove, self.filename)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(get(self.port, '/file'), f.read())
+
+    def test_sendfile_range(self):
+        self.filename = make_file(1 << 20)
+        self.addCleanup(os.remove, self.filename)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(get(self.port, '/range'), f.read()[1000:6000])
+
+    def test_concurrent_requests(self):
+        results = []
+
+        def request():
+            results.append(get(self.port))
+
+        clients = [threading.Thread(target=request) for _ in range(4)]
+        start = time.time()
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        self.assertEqual(results, [b'slow'] * 4)
+        # served by the pool in parallel, not one after another.
+        self.assertLess(time.time() - start, 1.0)
+
+
+class PreforkServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        self.master = os.fork()
+        if self.master == 0:
+            try:
+                PreforkServer(port=self.port, workers=1, max_requests=2,
+                              handler_class=QuietHandler).run(pid_app)
+            finally:
+                os._exit(0)
+
+    def tearDown(self):
+        os.kill(self.master, signal.SIGTERM)
+        os.waitpid(self.master, 0)
+
+    def test_served_by_worker(self):
+        pid = int(get(self.port))
+        self.assertNotEqual(pid, self.master)
+        self.assertNotEqual(pid, os.getpid())
+
+    def test_max_requests_recycle(self):
+        first = get(self.port)
+        self.assertEqual(get(self.port), first)
+        # the worker has served max_requests and was replaced.
+        self.assertNotEqual(get(self.port), first)
+
+    def test_restart(self):
+        first = get(self.port)
+        os.kill(self.master, signal.SIGHUP)
+        time.sleep(1.5)
+        self.assertNotEqual(get(self.port), first)
+
+
+def hello_app(environ, start_response):
+    body = 'Hello {0}!'.format(environ['PATH_INFO'].lstrip('/')).encode()
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [body]
+
+
+flango_app = Flango('__main__')
+
+
+@flango_app.route('/flango')
+def flango_view():
+    return 'Hello flango!'
+
+
+def stream_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return (chunk for chunk in [b'a', b'bc'])
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class AsyncioServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        self.server = AsyncioServer(port=self.port, threads=2)
+        self.thread = threading.Thread(target=self.server.run, args=(self.dispatch, ))
+        self.thread.daemon = True
+        self.thread.start()
+        get(self.port)
+
+    def tearDown(self):
+        self.server.loop.call_soon_threadsafe(self.server.loop.stop)
+        self.thread.join()
+
+    def dispatch(self, environ, start_response):
+        if environ['PATH_INFO'] == '/stream':
+            return stream_app(environ, start_response)
+        if environ['PATH_INFO'] == '/flango':
+            return flango_app(environ, start_response)
+        if environ['PATH_INFO'] == '/slow':
+            return slow_app(environ, start_response)
+        if environ['PATH_INFO'] == '/file':
+            environ['FILE'] = self.filename
+            return file_app(environ, start_response)
+        if environ['PATH_INFO'] == '/range':
+            environ['FILE'] = self.filename
+            return range_app(environ, start_response)
+        return hello_app(environ, start_response)
+
+    def test_sendfile(self):
+        self.filename = make_file(1 << 20)
+        self.addCleanup(os.remove, self.filename)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(get(self.port, '/file'), f.read())
+
+    def test_sendfile_range(self):
+        self.filename = make_file(1 << 20)
+        self.addCleanup(os.remove, self.filename)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(get(self.port, '/range'), f.read()[1000:6000])
+
+    def connect(self):
+        conn = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.addCleanup(conn.close)
+        return conn
+
+    def read_until(self, conn, count, marker):
+        data = b''
+        while data.count(marker) < count:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def test_keep_alive(self):
+        conn = self.connect()
+        conn.sendall(b'GET /a HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        self.assertTrue(self.read_until(conn, 1, b'Hello a!').endswith(b'Hello a!'))
+        conn.sendall(b'GET /b HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        self.assertTrue(self.read_until(conn, 1, b'Hello b!').endswith(b'Hello b!'))
+
+    def test_pipelining(self):
+        conn = self.connect()
+        conn.sendall(b'GET /a HTTP/1.1\r\n\r\nGET /b HTTP/1.1\r\n\r\nGET /c HTTP/1.1\r\nConnection: close\r\n\r\n')
+        data = self.read_until(conn, 3, b'HTTP/1.1 200 OK')
+        data += self.read_until(conn, 1, b'Hello c!')
+        self.assertLess(data.index(b'Hello a!'), data.index(b'Hello b!'))
+        self.assertLess(data.index(b'Hello b!'), data.index(b'Hello c!'))
+        self.assertIn(b'Content-Length: 8', data)
+        # the server closes the connection after the last response.
+        self.assertEqual(conn.recv(4096), b'')
+
+    def test_chunked_response(self):
+        conn = self.connect()
+        conn.sendall(b'GET /stream HTTP/1.1\r\n\r\n')
+        data = self.read_until(conn, 1, b'0\r\n\r\n')
+        self.assertIn(b'Transfer-Encoding: chunked', data)
+        self.assertTrue(data.endswith(b'\r\n\r\n1\r\na\r\n2\r\nbc\r\n0\r\n\r\n'))
+
+    def test_http10_closes_connection(self):
+        conn = self.connect()
+        conn.sendall(b'GET /stream HTTP/1.0\r\n\r\n')
+        data = self.read_until(conn, 1, b'never')
+        self.assertIn(b'Connection: close', data)
+        self.assertTrue(data.endswith(b'abc'))
+
+    def test_http10_keep_alive_flango_response(self):
+        conn = self.connect()
+        conn.sendall(b'GET /flango HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+        data = self.read_until(conn, 1, b'Hello flango!')
+        self.assertIn(b'Content-Length: 13', data)
+        self.assertIn(b'Connection: keep-alive', data)
+        self.assertNotIn(b'Transfer-Encoding', data)
+        conn.sendall(b'GET /flango HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+        self.assertTrue(self.read_until(conn, 1, b'Hello flango!').endswith(b'Hello flango!'))
+
+    def test_bad_request(self):
+        conn = self.connect()
+        conn.sendall(b'NONSENSE\r\n\r\n')
+        self.assertTrue(self.read_until(conn, 1, b'never').startswith(b'HTTP/1.1 400 Bad Request'))
+
+    def test_invalid_content_length(self):
+        for length in (b'-20', b'+5', b'x'):
+            conn = self.connect()
+            conn.sendall(b'POST /a HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n' + b'x' * 20 +
+                         b'GET /b HTTP/1.1\r\n\r\n')
+            data = self.read_until(conn, 1, b'never')
+            self.assertTrue(data.startswith(b'HTTP/1.1 400 Bad Request'))
+            self.assertNotIn(b'Hello', data)
+
+    def test_bad_request_after_pipelined_request(self):
+        conn = self.connect()
+        conn.sendall(b'GET /slow HTTP/1.1\r\n\r\nNONSENSE\r\n\r\n')
+        data = self.read_until(conn, 1, b'never')
+        # the error waits for the response of the previous request.
+        self.assertTrue(data.startswith(b'HTTP/1.1 200 OK'))
+        self.assertLess(data.index(b'slow'), data.index(b'HTTP/1.1 400 Bad Request'))
+
+    def test_large_body(self):
+        body = b'x' * (1 << 20)
+        conn = self.connect()
+        conn.sendall(b'POST /a HTTP/1.1\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body +
+                     b'GET /b HTTP/1.1\r\nConnection: close\r\n\r\n')
+        data = self.read_until(conn, 1, b'Hello b!')
+        self.assertLess(data.index(b'Hello a!'), data.index(b'Hello b!'))
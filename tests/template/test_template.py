@@ -1,7 +1,11 @@
 import unittest
 import os
+import shutil
+import tempfile
+import time
 
-from flango.template import Template, TemplateException, Loader
+from flango.template import Template, TemplateException, TemplateSyntaxError, Loader, Scanner, BytecodeCache, \
+    Markup, escape, FragmentCache
 
 
 class LoaderTest(unittest.TestCase):
@@ -136,12 +140,214 @@ class BaseTest(unittest.TestCase):
            content="<p>hello escape</p>")
        self.assertEqual(rendered, '&lt;p&gt;hello escape&lt;/p&gt;')
 
+    def test_escape_markup(self):
+        t = Template("{{ content }}{{ 1 }}", autoescape=True)
+        self.assertEqual(t.render(content=Markup('<p>safe</p>')), '<p>safe</p>1')
+        self.assertEqual(escape(Markup('<b>')), '<b>')
+        self.assertEqual(escape(3), '3')
+        self.assertEqual(escape('"\'&'), '&quot;&#039;&amp;')
+
+    def test_escape_safe(self):
+        t = Template("{{ content|safe }} {{ content | safe }} {{ content }}", autoescape=True)
+        self.assertEqual(t.render(content='<b>'), '<b> <b> &lt;b&gt;')
+
     def test_not_escape(self):
        rendered = Template("{{ content }}", autoescape=False).render(
            content="<p>hello escape</p>")
        self.assertEqual(rendered, '<p>hello escape</p>')
 
 
+class ScannerTest(unittest.TestCase):
+
+    def test_locations(self):
+        scanner = Scanner('a {{ b }}\n  {% if c %}\n\n{{ d }}{% endif %}')
+        locations = []
+        while scanner.next_token():
+            locations.append((scanner.pretext, scanner.lineno, scanner.column))
+        self.assertEqual(locations, [('a ', 1, 3), ('\n  ', 2, 3), ('\n\n', 4, 1), ('', 4, 8)])
+        self.assertTrue(scanner.empty)
+
+    def test_remain(self):
+        scanner = Scanner('{{ a }} tail')
+        scanner.next_token()
+        self.assertEqual(scanner.remain, ' tail')
+        self.assertEqual(scanner.next_token(), None)
+
+
+class SyntaxErrorTest(unittest.TestCase):
+
+    def assertLocation(self, source, lineno, column):
+        try:
+            Template(source, name='page.html')
+        except TemplateSyntaxError as e:
+            self.assertEqual((e.name, e.lineno, e.column), ('page.html', lineno, column))
+            self.assertTrue('page.html, line {0}, column {1}'.format(lineno, column) in str(e))
+        else:
+            self.fail('TemplateSyntaxError not raised')
+
+    def test_invalid_keyword(self):
+        self.assertLocation('<p>\n  {% foo bar %}</p>', 2, 3)
+
+    def test_invalid_expression(self):
+        self.assertLocation('<p>\n\n    {{ a + }}</p>', 3, 5)
+
+    def test_invalid_statement(self):
+        self.assertLocation('{% for i in range(3) %}\n{% if i > %}{% endif %}{% endfor %}', 2, 1)
+
+    def test_unexpected_endtag(self):
+        self.assertLocation('<p>{% endfor %}', 1, 4)
+
+    def test_is_template_exception(self):
+        self.assertRaises(TemplateException, Template, '{% foo %}')
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_stream_chunks(self):
+        t = Template('''
+            {% for i in l %}
+                {{ i }}
+            {% endfor %}
+            ''', buffer_size=4)
+        chunks = list(t.stream(l=range(10)))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), t.render(l=range(10)))
+        self.assertEqual(t.render(l=range(10)), '\n' + ''.join(
+            '                {0}\n'.format(i) for i in range(10)) + '            ')
+
+    def test_stream_is_lazy(self):
+        seen = []
+
+        def item(i):
+            seen.append(i)
+            return i
+
+        t = Template('{% for i in l %}{{ item(i) }}{% endfor %}', buffer_size=2)
+        chunks = t.stream(l=range(10), item=item)
+        self.assertEqual(next(chunks), '01')
+        self.assertEqual(seen, [0, 1])
+
+
+class WhitespaceTest(unittest.TestCase):
+
+    def test_tag_lines(self):
+        t = Template('<ul>\n  {% for i in l %}\n  <li>{{ i }}</li>\n  {% endfor %}\n</ul>')
+        self.assertEqual(t.render(l=[1, 2]), '<ul>\n  <li>1</li>\n  <li>2</li>\n</ul>')
+
+    def test_strip_markers(self):
+        t = Template('a  \n {%- for i in l -%}  \n {{ i }} {%- endfor %}\nb')
+        self.assertEqual(t.render(l=[1, 2]), 'a12b')
+
+    def test_inline_tags(self):
+        t = Template('{% if a %}yes{% else %}no{% endif %} {{ a }}')
+        self.assertEqual(t.render(a=0), 'no 0')
+
+    def test_merged_text(self):
+        t = Template('a{% if True %}\n{% endif %}b\r\nc \'\'\' \\n')
+        self.assertEqual(t.render(), 'ab\nc \'\'\' \\n')
+        t = Template("{% for i in l %}\n<td>\n  {% if i %}\n  <b>\n  {% endif %}\n</td>\n{% endfor %}")
+        self.assertEqual([node.text for node in t.nodes if type(node).__name__ == 'TextNode'],
+                         ['<td>\n', '  <b>\n', '</td>\n'])
+
+
+class NamespaceTest(unittest.TestCase):
+
+    def test_namespace(self):
+        template = Template('{{ upper(name) }}')
+        namespace = {'upper': lambda s: s.upper(), 'name': 'namespace'}
+        self.assertEqual(template.render_context({}, namespace), 'NAMESPACE')
+        # the context hides the namespace.
+        self.assertEqual(template.render_context({'name': 'flango'}, namespace), 'FLANGO')
+
+    def test_names(self):
+        template = Template('{% for i in items %}{{ [x for x in i] }}{% endfor %}')
+        self.assertTrue('items' in template.names)
+        self.assertFalse('unused' in template.names)
+
+
+class LocalsTest(unittest.TestCase):
+
+    def test_undefined_name(self):
+        template = Template('{% if user %}{{ user }}{% else %}\n{{ guest }}{% endif %}')
+        # only the rendered branch needs its names.
+        self.assertEqual(template.render(user='flango'), 'flango')
+        self.assertRaises(NameError, template.render, user=None)
+
+    def test_constants(self):
+        self.assertEqual(Template('{{ a is None }} {{ True }}').render(a=None), 'True True')
+
+    def test_builtin_hidden_by_context(self):
+        template = Template('{{ len(items) }}')
+        self.assertEqual(template.render(items=[1, 2]), '2')
+        self.assertEqual(template.render(items=[1, 2], len=lambda items: 'len'), 'len')
+
+    def test_nested_scopes(self):
+        template = Template('{{ [n * factor for n in items] }}{{ (lambda: factor)() }}')
+        self.assertEqual(template.render(items=[1, 2], factor=3), '[3, 6]3')
+        # the variable of a list comprehension is a local of `_render` on Python 2.
+        self.assertEqual(template.names - frozenset(['n']), frozenset(['items', 'factor']))
+
+    def test_assigned_name_read_before_assignment(self):
+        template = Template('{{ item }}|{% for item in items %}{{ item }}{% endfor %}')
+        self.assertEqual(template.render(item='X', items=[1, 2]), 'X|12')
+        template = Template('{% for post in posts %}{{ post }}{% endfor %}{{ post }}')
+        self.assertEqual(template.render(post='P', posts=[]), 'P')
+        self.assertRaises(NameError, template.render, posts=[])
+
+
+class FragmentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def call(self, value):
+        self.calls.append(value)
+        return value
+
+    def test_cached(self):
+        t = Template("{% for i in l %}{% cache ('item', i) %}<{{ call(i) }}>{% endcache %}{% endfor %}")
+        self.assertEqual(t.render(l=[1, 2], call=self.call), '<1><2>')
+        self.assertEqual(t.render(l=[1, 2, 3], call=self.call), '<1><2><3>')
+        self.assertEqual(self.calls, [1, 2, 3])
+
+    def test_nested(self):
+        t = Template("{% cache key %}a{% cache 'inner' %}{{ call('b') }}{% endcache %}"
+                     "{{ call('c') }}{% endcache %}", buffer_size=1)
+        self.assertEqual(t.render(key=1, call=self.call), 'abc')
+        self.assertEqual(t.render(key=2, call=self.call), 'abc')
+        self.assertEqual(self.calls, ['b', 'c', 'c'])
+
+    def test_include_inside_cache(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with open(os.path.join(root, 'part.html'), 'w') as f:
+            f.write("{% cache 'part', 60 %}[{{ call('P') }}]{% endcache %}")
+        t = Template("<{% cache 'side', 60 %}S1 {% include 'part.html' %} S2{% endcache %}>", loader=Loader(root))
+        self.assertEqual(t.render(call=self.call), '<S1 [P] S2>')
+        self.assertEqual(t.render(call=self.call), '<S1 [P] S2>')
+        self.assertEqual(self.calls, ['P'])
+
+    def test_ttl(self):
+        t = Template("{% cache 'key', 0 %}{{ call(1) }}{% endcache %}")
+        t.render(call=self.call)
+        t.render(call=self.call)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_loader_backend(self):
+        fragments = FragmentCache(capacity=1)
+        loader = Loader(os.path.dirname(os.path.realpath(__file__)), fragment_cache=fragments)
+        t = Template("{% cache key %}{{ call(key) }}{% endcache %}", loader=loader)
+        t.render(key=1, call=self.call)
+        t.render(key=2, call=self.call)
+        self.assertEqual(len(fragments), 1)
+        t.render(key=1, call=self.call)
+        self.assertEqual(self.calls, [1, 2, 1])
+
+    def test_syntax_errors(self):
+        self.assertRaises(TemplateSyntaxError, Template, '{% cache %}{% endcache %}')
+        self.assertRaises(TemplateSyntaxError, Template, '{% if a %}{% endcache %}')
+
+
 class FunctionTest(unittest.TestCase):
 
     def test_simple_1(self):
@@ -182,6 +388,142 @@ class SubtemplateTest(unittest.TestCase):
             'test_include.html').render()
         self.assertEqual(rendered, "<p>Included</p>")
 
+    def test_shared_loader(self):
+        loader = Loader(os.path.dirname(os.path.realpath(__file__)))
+        page = loader.load('test_extends.html')
+        page.render(title='flango')
+        self.assertTrue(page.parent is loader.load('base.html'))
+
+    def test_include_keeps_nodes(self):
+        loader = Loader(os.path.dirname(os.path.realpath(__file__)))
+        included = loader.load('included.html')
+        indents = [node.indent for node in included.nodes]
+        Template("{% for i in range(2) %}{% include 'included.html' %}{% endfor %}", loader=loader).render()
+        self.assertEqual([node.indent for node in included.nodes], indents)
+
+    def test_render_base(self):
+        rendered = Loader(os.path.dirname(os.path.realpath(__file__))).load('base.html').render(title='flango')
+        self.assertTrue('<p>This block body</p>' in rendered)
+
+
+class AutoReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write('base.html', '<h1>{% block title %}{% endblock %}</h1>')
+        self.write('page.html', "{% extends 'base.html' %}{% block title %}{{ name }}{% endblock %}")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, source, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_no_reload_by_default(self):
+        loader = Loader(self.root)
+        template = loader.load('page.html')
+        self.write('page.html', 'changed', mtime=1)
+        self.assertTrue(loader.load('page.html') is template)
+
+    def test_unchanged_template_stays_cached(self):
+        loader = Loader(self.root, auto_reload=True, check_interval=0)
+        template = loader.load('page.html')
+        self.assertTrue(loader.load('page.html') is template)
+
+    def test_changed_template(self):
+        loader = Loader(self.root, auto_reload=True, check_interval=0)
+        loader.load('page.html')
+        self.write('page.html', 'changed {{ name }}', mtime=1)
+        self.assertEqual(loader.load('page.html').render(name='flango'), 'changed flango')
+
+    def test_changed_parent(self):
+        loader = Loader(self.root, auto_reload=True, check_interval=0)
+        loader.load('page.html')
+        self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>', mtime=1)
+        self.assertEqual(loader.load('page.html').render(name='flango'), '<h2>flango</h2>')
+
+    def test_child_compiled_with_stale_parent(self):
+        loader = Loader(self.root, auto_reload=True, check_interval=0.2)
+        loader.load('base.html')
+        self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>', mtime=1)
+        self.write('page.html', "{% extends 'base.html' %}{% block title %}[{{ name }}]{% endblock %}", mtime=1)
+        # the parent is not checked yet, the child is compiled with the old one.
+        self.assertEqual(loader.load('page.html').render(name='flango'), '<h1>[flango]</h1>')
+        time.sleep(0.3)
+        self.assertEqual(loader.load('page.html').render(name='flango'), '<h2>[flango]</h2>')
+
+    def test_check_interval(self):
+        loader = Loader(self.root, auto_reload=True, check_interval=60)
+        template = loader.load('page.html')
+        self.write('page.html', 'changed', mtime=1)
+        self.assertTrue(loader.load('page.html') is template)
+
+
+class BytecodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.root, 'cache')
+        self.write('base.html', '<h1>{% block title %}{% endblock %}</h1>')
+        self.write('page.html', "{% extends 'base.html' %}{% block title %}{{ name }}{% endblock %}")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, source, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def loader(self):
+        return Loader(self.root, bytecode_cache=BytecodeCache(self.cache_dir))
+
+    def test_code_is_reused(self):
+        template = self.loader().load('page.html')
+        self.assertEqual(template.render(name='flango'), '<h1>flango</h1>')
+        self.assertEqual(template.dependencies, [os.path.join(self.root, 'base.html')])
+        # the parent is loaded by the same loader, its code is cached too.
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        cached = self.loader().load('page.html')
+        # loaded from the cache, the template is not parsed.
+        self.assertEqual(cached._nodes, None)
+        self.assertEqual(cached.intermediate.co_consts, template.intermediate.co_consts)
+        self.assertEqual(cached.render(name='flango'), '<h1>flango</h1>')
+        self.assertEqual(cached.dependencies, template.dependencies)
+
+    def test_changed_template(self):
+        self.loader().load('page.html')
+        self.write('page.html', "{% extends 'base.html' %}{% block title %}[{{ name }}]{% endblock %}")
+        self.assertEqual(self.loader().load('page.html').render(name='flango'), '<h1>[flango]</h1>')
+
+    def test_changed_dependency(self):
+        self.loader().load('page.html')
+        self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>', mtime=1)
+        self.assertEqual(self.loader().load('page.html').render(name='flango'), '<h2>flango</h2>')
+
+    def test_stale_dependency_in_memory(self):
+        loader = Loader(self.root, bytecode_cache=BytecodeCache(self.cache_dir),
+                        auto_reload=True, check_interval=60)
+        loader.load('base.html')
+        self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>', mtime=1)
+        # compiled with the parent held in memory, which is older than the file.
+        self.assertEqual(loader.load('page.html').render(name='flango'), '<h1>flango</h1>')
+        self.assertEqual(self.loader().load('page.html').render(name='flango'), '<h2>flango</h2>')
+
+    def test_corrupted_file(self):
+        self.loader().load('page.html')
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'wb') as f:
+                f.write(BytecodeCache.MAGIC + b'garbage')
+        self.assertEqual(self.loader().load('page.html').render(name='flango'), '<h1>flango</h1>')
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file